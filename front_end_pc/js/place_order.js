@@ -16,8 +16,8 @@ var vm = new Vue({
         addresses: []
     },
     mounted: function(){
-        // 获取地址信息
-        axios.get(this.host + '/addresses/', {
+        // 一次请求获取地址信息和结算商品信息
+        axios.get(this.host + '/orders/checkout/', {
                 headers: {
                     'Authorization': 'JWT ' + this.token
                 },
@@ -26,23 +26,6 @@ var vm = new Vue({
             .then(response => {
                 this.addresses = response.data.addresses;
                 this.nowsite = response.data.default_address_id;
-            })
-            .catch(error => {
-                status = error.response.status;
-                if (status == 401 || status == 403) {
-                    location.href = 'login.html?next=/user_center_site.html';
-                } else {
-                    alert(error.response.data.detail);
-                }
-            })
-        // 获取结算商品信息
-        axios.get(this.host+'/orders/settlement/', {
-                headers: {
-                    'Authorization': 'JWT ' + this.token
-                },
-                responseType: 'json'
-            })
-            .then(response => {
                 this.skus = response.data.skus;
                 this.freight = response.data.freight;
                 this.total_count = 0;
@@ -58,13 +41,24 @@ var vm = new Vue({
                 this.total_amount = this.total_amount.toFixed(2);
             })
             .catch(error => {
-                if (error.response.status == 401){
+                if (error.response.status == 401 || error.response.status == 403){
                     location.href = '/login.html?next=/cart.html';
                 } else{
                     console.log(error.response.data);
                 }
             })
     },
+    watch: {
+        // 切换收货地址时使用寄往该地址的运费
+        nowsite: function(address_id){
+            for(var i=0; i<this.addresses.length; i++){
+                if (this.addresses[i].id == address_id){
+                    this.freight = this.addresses[i].freight;
+                    this.payment_amount = (parseFloat(this.freight) + parseFloat(this.total_amount)).toFixed(2);
+                }
+            }
+        }
+    },
     methods: {
         // 退出
         logout: function(){
@@ -1,4 +1,6 @@
 
+from datetime import timedelta
+
 # 使用队列的位置
 BROKER_URL = 'redis://127.0.0.1:6379/14'
 
@@ -13,4 +15,27 @@ CELERY_IMPORTS = (
     'celery_tasks.sms',
     'celery_tasks.email',
     'celery_tasks.html',
+    'celery_tasks.stock',
+    'celery_tasks.order_queue',
+    'celery_tasks.order_expire',
+    'celery_tasks.sales',
 )
+
+# 异步下单使用单独的队列
+CELERY_ROUTES = {
+    'place_order': {'queue': 'orders'},
+}
+
+# 定时任务
+CELERYBEAT_SCHEDULE = {
+    # 每30秒取消一次到期未支付的订单
+    'cancel_expired_orders': {
+        'task': 'cancel_expired_orders',
+        'schedule': timedelta(seconds=30),
+    },
+    # 每分钟合并一次商品销量
+    'flush_sales': {
+        'task': 'flush_sales',
+        'schedule': timedelta(seconds=60),
+    },
+}
@@ -1,38 +1,175 @@
+from django.db.models import Prefetch
 from django.template import loader
-from django.conf import settings
-import os
+from django_redis import get_redis_connection
 
 from celery_tasks import app
+from meiduo_mall.utils.exceptions import logger
+from meiduo_mall.utils.static_html import write_static_html, delete_static_html, queue_cdn_purge
+from goods import constants
 from goods.utils import get_categories
-from goods.models import SKU
+from goods.models import SKU, Goods, GoodsSpecification, SKUSpecification
 
 
-@app.task(name='generate_static_sku_detail_html')
-def generate_static_sku_detail_html(sku_id):
+# tips--商品修改后合并生成详情页面
+# 后台连续修改同一商品的多条规格, 图片时, 每次保存只记录SPU, 延迟一段时间后每个SPU只生成一次
+#   detail_html_dirty:               zset {goods_id: 记录时的序号} 待生成页面的SPU, 同一SPU再次修改时序号变大
+#   detail_html_dirty_seq:           string 递增的序号
+#   detail_html_flush_scheduled:     string 已安排生成任务的标记, 存在时不再安排新的任务
+#   detail_html_lock_<goods_id>:     string 正在生成该SPU页面的worker持有的锁
+# note--页面写入成功后才从待生成集合中移除, 生成失败或worker崩溃时SPU仍在集合中, 下次任务重新生成
+DIRTY_KEY = 'detail_html_dirty'
+DIRTY_SEQ_KEY = 'detail_html_dirty_seq'
+FLUSH_SCHEDULED_KEY = 'detail_html_flush_scheduled'
+
+# 记录待生成的SPU KEYS: 待生成集合, 序号; ARGV: goods_id
+MARK_DIRTY_SCRIPT = """
+local seq = redis.call('incr', KEYS[2])
+redis.call('zadd', KEYS[1], seq, ARGV[1])
+return seq
+"""
+
+# 生成完成后移除SPU KEYS: 待生成集合; ARGV: goods_id, 开始生成时的序号
+# 生成期间SPU又被修改(序号变化)时保留, 由下次任务再生成
+MARK_DONE_SCRIPT = """
+if redis.call('zscore', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('zrem', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+def detail_html_lock_key(goods_id):
+    return 'detail_html_lock_%s' % goods_id
+
+
+def schedule_goods_detail_html(goods_id):
     """
-    生成静态商品详情页面
-    :param sku_id: 商品sku id
+    记录需要重新生成详情页面的SPU, 延迟DETAIL_HTML_DEBOUNCE秒后统一生成
     """
-    # 商品分类菜单
+    redis_conn = get_redis_connection('goods')
+    redis_conn.register_script(MARK_DIRTY_SCRIPT)(keys=[DIRTY_KEY, DIRTY_SEQ_KEY], args=[goods_id])
+    schedule_flush(redis_conn)
+
+
+def schedule_flush(redis_conn):
+    """
+    还没有安排生成任务时, 安排一个延迟执行的任务
+    """
+    # note--标记设置有效期, 生成任务丢失时之后的修改可以重新安排
+    if redis_conn.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=constants.DETAIL_HTML_FLUSH_SCHEDULED_EXPIRES):
+        flush_goods_detail_html.apply_async(countdown=constants.DETAIL_HTML_DEBOUNCE)
+
+
+@app.task(name='flush_goods_detail_html', bind=True, max_retries=constants.DETAIL_HTML_FLUSH_MAX_RETRIES)
+def flush_goods_detail_html(self):
+    """
+    生成所有待生成的SPU的详情页面, 有SPU生成失败时稍后重试
+    :return: 生成的goods_id列表
+    """
+    redis_conn = get_redis_connection('goods')
+    # 先清除标记再读取待生成的SPU, 读取之后的修改会安排新的任务
+    redis_conn.delete(FLUSH_SCHEDULED_KEY)
+    dirty = redis_conn.zrange(DIRTY_KEY, 0, -1, withscores=True)
+    if not dirty:
+        return []
+
+    # 所有SPU共用同一份分类菜单
     categories = get_categories()
+    mark_done = redis_conn.register_script(MARK_DONE_SCRIPT)
+    generated = []
+    failed = []
+    for goods_id, seq in dirty:
+        goods_id = int(goods_id)
+        try:
+            result = render_goods_detail_html_locked(goods_id, categories, redis_conn)
+        except Exception as e:
+            logger.error('生成商品%s详情页面失败: %s' % (goods_id, e))
+            failed.append(goods_id)
+            continue
 
-    # 获取当前sku的信息
-    sku = SKU.objects.get(id=sku_id)
-    sku.images = sku.skuimage_set.all()
+        if result is None:
+            # 其他worker正在生成, 可能读到的是修改之前的数据, 保留在集合中由下次任务再生成
+            schedule_flush(redis_conn)
+            continue
 
-    # 面包屑导航信息中的频道
-    goods = sku.goods
-    goods.channel = goods.category1.goodschannel_set.all()[0]
+        mark_done(keys=[DIRTY_KEY], args=[goods_id, int(seq)])
+        generated.append(goods_id)
 
-    # 构建当前商品的规格键
-    # sku_key = [规格1参数id， 规格2参数id， 规格3参数id, ...]
-    sku_specs = sku.skuspecification_set.order_by('spec_id')
-    sku_key = []
-    for spec in sku_specs:
-        sku_key.append(spec.option.id)
+    if failed:
+        # 失败的SPU仍在集合中, 重试时重新生成; 超过重试次数后等下次修改或regenerate_detail_html命令
+        raise self.retry(exc=Exception('商品%s详情页面生成失败' % failed), countdown=constants.DETAIL_HTML_RETRY_DELAY)
+    return generated
+
+
+@app.task(name='generate_static_goods_detail_html')
+def generate_static_goods_detail_html(goods_id):
+    """
+    生成一个商品SPU下所有SKU的静态详情页面
+    :param goods_id: 商品spu id
+    :return: (生成的sku_id列表, 内容有变化的sku_id列表), 其他worker正在生成时返回None
+    """
+    # 商品分类菜单
+    result = render_goods_detail_html_locked(goods_id, get_categories())
+    if result is None:
+        # 其他worker正在生成, 可能读到的是修改之前的数据, 稍后再生成一次
+        schedule_goods_detail_html(goods_id)
+    return result
+
+
+def render_goods_detail_html_locked(goods_id, categories, redis_conn=None):
+    """
+    持有该SPU的锁时生成页面, 避免两个进程同时写同一个页面
+    生成失败时抛出异常, 由调用方决定是否重试
+    :return: (生成的sku_id列表, 内容有变化的sku_id列表), SPU已被删除时都为空, 其他进程正在生成时返回None
+    """
+    redis_conn = redis_conn or get_redis_connection('goods')
+    lock_key = detail_html_lock_key(goods_id)
+    if not redis_conn.set(lock_key, 1, nx=True, ex=constants.DETAIL_HTML_LOCK_EXPIRES):
+        return None
+
+    try:
+        return render_goods_detail_html(goods_id, categories)
+    except Goods.DoesNotExist:
+        # SPU已被删除
+        return [], []
+    finally:
+        redis_conn.delete(lock_key)
 
-    # 获取当前商品的所有SKU
-    skus = goods.sku_set.all()
+
+def render_goods_detail_html(goods_id, categories):
+    """
+    生成一个商品SPU下所有SKU的静态详情页面, 批量生成时多个SPU共用同一份分类菜单
+    note--同一SPU的SKU共用分类菜单, 规格选项和规格-SKU字典, 整个SPU只查询一次, 与SKU数量无关
+    内容有变化和被删除的页面记录到待刷新CDN的集合中
+    :return: (生成的sku_id列表, 内容有变化或被删除的sku_id列表)
+    """
+    # 一次取出商品及其所有SKU, SKU的图片和规格, 商品的规格和选项
+    goods = Goods.objects.select_related('category1', 'category2', 'category3').prefetch_related(
+        Prefetch('sku_set', queryset=SKU.objects.order_by('id').prefetch_related(
+            'skuimage_set',
+            Prefetch('skuspecification_set', queryset=SKUSpecification.objects.order_by('spec_id')),
+        )),
+        Prefetch('goodsspecification_set', queryset=GoodsSpecification.objects.order_by('id').prefetch_related(
+            'specificationoption_set')),
+    ).get(id=goods_id)
+
+    # 面包屑导航信息中的频道, 分类菜单中已经有每个一级类别的频道, 不再查询
+    goods.channel = find_channel(categories, goods.category1_id)
+    template = loader.get_template('detail.html')
+
+    # 下架的SKU不生成页面, 规格链接也不指向它们, 已有的页面删除
+    skus = []
+    removed = []
+    for sku in goods.sku_set.all():
+        if sku.is_launched:
+            skus.append(sku)
+        elif delete_static_html(sku_detail_html_path(sku.id)):
+            removed.append(sku.id)
+    specs = list(goods.goodsspecification_set.all())
+
+    # 构建当前商品的规格键
+    # sku_keys = { sku_id: [规格1参数id， 规格2参数id， 规格3参数id, ...] }
+    sku_keys = dict((sku.id, [spec.option_id for spec in sku.skuspecification_set.all()]) for sku in skus)
 
     # 构建不同规格参数（选项）的sku字典
     # spec_sku_map = {
@@ -40,61 +177,85 @@ def generate_static_sku_detail_html(sku_id):
     #     (规格1参数id, 规格2参数id, 规格3参数id, ...): sku_id,
     #     ...
     # }
-    spec_sku_map = {}
-    for s in skus:
-        # 获取sku的规格参数
-        s_specs = s.skuspecification_set.order_by('spec_id')
-        # 用于形成规格参数-sku字典的键
-        key = []
-        for spec in s_specs:
-            key.append(spec.option.id)
-        # 向规格参数-sku字典添加记录
-        spec_sku_map[tuple(key)] = s.id
-
-    # 获取当前商品的规格信息
-    #specs = [
-    #    {
-    #        'name': '屏幕尺寸',
-    #        'options': [
-    #            {'value': '13.3寸', 'sku_id': xxx},
-    #            {'value': '15.4寸', 'sku_id': xxx},
-    #        ]
-    #    },
-    #    {
-    #        'name': '颜色',
-    #        'options': [
-    #            {'value': '银色', 'sku_id': xxx},
-    #            {'value': '黑色', 'sku_id': xxx}
-    #        ]
-    #    },
-    #    ...
-    #]
-    specs = goods.goodsspecification_set.order_by('id')
-    # 若当前sku的规格信息不完整，则不再继续
-    if len(sku_key) < len(specs):
-        return
-    for index, spec in enumerate(specs):
-        # 复制当前sku的规格键
-        key = sku_key[:]
-        # 该规格的选项
-        options = spec.specificationoption_set.all()
-        for option in options:
-            # 在规格参数sku字典中查找符合当前规格的sku
-            key[index] = option.id
-            option.sku_id = spec_sku_map.get(tuple(key))
-
-        spec.options = options
-
-    # 渲染模板，生成静态html文件
-    context = {
-        'categories': categories,
-        'goods': goods,
-        'specs': specs,
-        'sku': sku
-    }
+    spec_sku_map = dict((tuple(key), sku_id) for sku_id, key in sku_keys.items())
 
-    template = loader.get_template('detail.html')
+    generated = []
+    changed = []
+    for sku in skus:
+        sku_key = sku_keys[sku.id]
+        # 若当前sku的规格信息不完整，则不生成
+        if len(sku_key) < len(specs):
+            continue
+
+        # 当前sku页面的规格信息, 每个选项链接到只改变该规格的sku
+        #specs = [
+        #    {
+        #        'name': '屏幕尺寸',
+        #        'options': [
+        #            {'value': '13.3寸', 'sku_id': xxx},
+        #            {'value': '15.4寸', 'sku_id': xxx},
+        #        ]
+        #    },
+        #    ...
+        #]
+        sku_specs = []
+        for index, spec in enumerate(specs):
+            # 复制当前sku的规格键
+            key = sku_key[:]
+            options = []
+            for option in spec.specificationoption_set.all():
+                # 在规格参数sku字典中查找符合当前规格的sku
+                key[index] = option.id
+                options.append({'id': option.id, 'value': option.value, 'sku_id': spec_sku_map.get(tuple(key))})
+            sku_specs.append({'name': spec.name, 'options': options})
+
+        sku.images = sku.skuimage_set.all()
+        if write_sku_detail_html(template, sku, {
+            'categories': categories,
+            'goods': goods,
+            'specs': sku_specs,
+            'sku': sku
+        }):
+            changed.append(sku.id)
+        generated.append(sku.id)
+
+    changed.extend(removed)
+    queue_cdn_purge(sku_detail_html_path(sku_id) for sku_id in changed)
+    return generated, changed
+
+
+@app.task(name='generate_static_sku_detail_html')
+def generate_static_sku_detail_html(sku_id):
+    """
+    生成静态商品详情页面
+    note--一个SKU的规格变化会影响同一SPU其他SKU页面中的规格链接, 所以重新生成整个SPU
+    :param sku_id: 商品sku id
+    """
+    goods_id = SKU.objects.filter(id=sku_id).values_list('goods_id', flat=True).first()
+    if goods_id is not None:
+        schedule_goods_detail_html(goods_id)
+
+
+def find_channel(categories, category1_id):
+    """
+    在分类菜单中查找一级类别的频道
+    :return: {'id':, 'name':, 'url':}
+    """
+    for group in categories.values():
+        for channel in group['channels']:
+            if channel['id'] == category1_id:
+                return channel
+    return None
+
+
+def write_sku_detail_html(template, sku, context):
+    """
+    渲染模板，生成静态html文件
+    :return: 页面内容是否有变化
+    """
     html_text = template.render(context)
-    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, 'goods/'+str(sku_id)+'.html')
-    with open(file_path, 'w') as f:
-        f.write(html_text)
\ No newline at end of file
+    return write_static_html(sku_detail_html_path(sku.id), html_text)
+
+
+def sku_detail_html_path(sku_id):
+    return 'goods/'+str(sku_id)+'.html'
@@ -0,0 +1,12 @@
+from celery_tasks import app
+from orders.expiry import cancel_expired_orders
+
+
+# 创建celery任务, 由celery beat定时触发: celery -A celery_tasks beat
+@app.task(name='cancel_expired_orders')
+def cancel_expired_orders_task():
+    """
+    取消到期未支付的订单
+    """
+    count = cancel_expired_orders()
+    return "自动取消订单--取消%d个订单" % count
@@ -0,0 +1,40 @@
+from rest_framework.exceptions import ValidationError
+
+from celery_tasks import app
+from meiduo_mall.utils.exceptions import logger
+from orders.serializers import SaveOrderSerializer
+from orders.tickets import start_ticket, finish_ticket
+from users.models import User
+
+
+# 创建celery任务
+# note--该任务路由到orders队列, 由单独的worker处理: celery -A celery_tasks worker -Q orders -c <并发数>
+# note--worker的并发数决定了同时下单的数量, 高峰期订单在队列中排队, 不会压垮数据库
+@app.task(name='place_order')
+def place_order(ticket, user_id, address_id, pay_method):
+    """
+    处理排队的订单
+    """
+    if not start_ticket(ticket):
+        return "异步下单--凭证已过期或已处理"
+
+    try:
+        user = User.objects.get(id=user_id)
+        serializer = SaveOrderSerializer(data={'address': address_id, 'pay_method': pay_method},
+                                         context={'user': user})
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+    except ValidationError as e:
+        # 取第一条错误信息
+        detail = e.detail
+        while isinstance(detail, (list, dict)):
+            detail = list(detail.values())[0] if isinstance(detail, dict) else detail[0]
+        finish_ticket(ticket, message=str(detail))
+        return "异步下单--下单失败"
+    except Exception as e:
+        logger.error(e)
+        finish_ticket(ticket)
+        raise
+
+    finish_ticket(ticket, order_id=order.order_id)
+    return "异步下单--下单成功"
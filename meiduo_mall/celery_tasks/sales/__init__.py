@@ -0,0 +1,14 @@
+from celery_tasks import app
+from goods.sales import flush_sales
+
+
+# 创建celery任务, 由celery beat定时触发
+@app.task(name='flush_sales')
+def flush_sales_task():
+    """
+    将商品销量增量合并到SKU和SPU的销量
+    """
+    count = flush_sales()
+    if count is None:
+        return "商品销量--其他进程正在合并"
+    return "商品销量--合并%d条增量" % count
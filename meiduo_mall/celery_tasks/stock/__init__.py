@@ -0,0 +1,18 @@
+from celery_tasks import app
+from orders import constants
+from orders.reservation import reconcile
+
+
+# 创建celery任务
+@app.task(name='reconcile_reserved_stock')
+def reconcile_reserved_stock():
+    """
+    将秒杀商品在redis中预扣的库存同步到数据库
+    """
+    counts = reconcile()
+    if counts is None:
+        # 其他任务正在同步, 稍后再处理这段时间新增的数据
+        reconcile_reserved_stock.apply_async(countdown=constants.RESERVED_STOCK_RECONCILE_DELAY)
+        return "预扣库存--其他任务正在同步"
+
+    return "预扣库存--同步%d个商品" % len(counts)
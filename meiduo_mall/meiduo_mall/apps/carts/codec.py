@@ -0,0 +1,192 @@
+"""
+未登录用户购物车cookie的编解码
+
+购物车在cookie中的逻辑结构为:
+    {
+        sku_id: {
+            "count": xxx,
+            "selected": True
+        },
+        ...
+    }
+
+紧凑格式(版本1)的字节结构为:
+    版本号(1字节) + [varint(sku_id) + varint(count << 1 | selected)] * n
+再使用urlsafe base64编码(去掉末尾的=), 保证cookie值中不出现需要转义的字符
+
+解码时根据第一个字节判断格式, 旧的pickle格式(以0x80开头)仍然可以读出, 但只允许还原dict/int/bool等基础类型
+"""
+import base64
+import io
+import pickle
+
+from carts import constants
+
+
+# 紧凑格式的版本号
+PACKED_VERSION = 1
+
+# pickle协议2及以上的数据都以该字节开头
+PICKLE_PROTO = 0x80
+
+
+class CartCodecError(ValueError):
+    """
+    cookie购物车数据无法解析
+    """
+    pass
+
+
+class SafeUnpickler(pickle.Unpickler):
+    """
+    只允许还原基础类型的unpickler, 旧格式的购物车只包含dict/int/bool, 不需要加载任何全局对象
+    """
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('购物车数据中不允许出现 %s.%s' % (module, name))
+
+
+def encode_varint(value, buf):
+    """
+    将非负整数按varint编码追加到buf中
+    """
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def decode_varint(data, pos):
+    """
+    从data的pos位置读取一个varint
+    :return: (数值, 下一个位置)
+    """
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise CartCodecError('varint数据不完整')
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise CartCodecError('varint数据过长')
+
+
+def is_int(value):
+    # bool是int的子类, 需要排除
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_valid_cart(cart):
+    """
+    检查旧格式购物车的结构: { int sku_id: {'count': int, 'selected': bool} }
+    note--cookie可以被任意修改, 结构不对时按空购物车处理, 避免视图中取count/selected时出错
+    """
+    if not isinstance(cart, dict):
+        return False
+    for sku_id, item in cart.items():
+        if not is_int(sku_id) or not isinstance(item, dict):
+            return False
+        if not is_int(item.get('count')) or item['count'] < 0 or not isinstance(item.get('selected'), bool):
+            return False
+    return True
+
+
+class BaseCartCodec(object):
+    """
+    购物车编解码基类, 解码同时兼容所有已知格式, 子类只需要决定写入的格式
+    """
+    def dumps(self, cart):
+        raise NotImplementedError
+
+    def loads(self, value):
+        """
+        解析cookie中的购物车, 数据为空或无法解析时返回空购物车
+        """
+        if not value:
+            return {}
+
+        try:
+            data = base64.urlsafe_b64decode(value.encode() + b'=' * (-len(value) % 4))
+            if not data:
+                return {}
+            if data[0] == PACKED_VERSION:
+                return self.loads_packed(data)
+            if data[0] == PICKLE_PROTO:
+                return self.loads_pickle(data)
+        except (ValueError, TypeError, EOFError, pickle.UnpicklingError):
+            return {}
+
+        return {}
+
+    @staticmethod
+    def loads_packed(data):
+        cart = {}
+        pos = 1
+        while pos < len(data):
+            sku_id, pos = decode_varint(data, pos)
+            value, pos = decode_varint(data, pos)
+            cart[sku_id] = {
+                'count': value >> 1,
+                'selected': bool(value & 1)
+            }
+        return cart
+
+    @staticmethod
+    def loads_pickle(data):
+        cart = SafeUnpickler(io.BytesIO(data)).load()
+        if not is_valid_cart(cart):
+            raise CartCodecError('购物车数据格式错误')
+        return cart
+
+
+class PickleCartCodec(BaseCartCodec):
+    """
+    旧的pickle + base64格式, 保留用于回滚
+    """
+    def dumps(self, cart):
+        return base64.b64encode(pickle.dumps(cart)).decode()
+
+
+class PackedCartCodec(BaseCartCodec):
+    """
+    紧凑的varint格式
+    """
+    def dumps(self, cart):
+        buf = bytearray([PACKED_VERSION])
+        for sku_id, item in cart.items():
+            encode_varint(int(sku_id), buf)
+            encode_varint(int(item['count']) << 1 | (1 if item['selected'] else 0), buf)
+        return base64.urlsafe_b64encode(bytes(buf)).rstrip(b'=').decode()
+
+
+CART_CODECS = {
+    'pickle': PickleCartCodec,
+    'packed': PackedCartCodec,
+}
+
+
+def get_cart_codec(name=None):
+    """
+    获取购物车编解码器, 默认使用constants中配置的格式
+    """
+    return CART_CODECS[name or constants.CART_COOKIE_CODEC]()
+
+
+def loads_cart(value):
+    """
+    解析cookie中的购物车
+    :param value: cookie值, 可以为None
+    :return: 购物车字典
+    """
+    return get_cart_codec().loads(value)
+
+
+def dumps_cart(cart):
+    """
+    将购物车字典编码为cookie值
+    """
+    return get_cart_codec().dumps(cart)
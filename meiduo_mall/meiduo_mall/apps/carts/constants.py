@@ -1,3 +1,18 @@
 
 # 购物车cookie过期时间
-CART_COOKIE_EXPIRES = 365 * 24 * 60 * 60
\ No newline at end of file
+CART_COOKIE_EXPIRES = 365 * 24 * 60 * 60
+
+# 购物车批量操作单次请求的最大操作条数
+CART_BATCH_OPERATIONS_LIMIT = 50
+
+# 购物车cookie的编码格式, 可选 packed / pickle, 两种格式在读取时都可以识别
+CART_COOKIE_CODEC = 'packed'
+
+# 登录用户购物车的redis存储方式, 可选 hash_set(数量hash + 勾选set) / packed(单个hash)
+CART_STORAGE_BACKEND = 'hash_set'
+
+# 从hash_set切换到packed的迁移期间设为True, 每次访问时顺带转换该用户旧格式的数据, 迁移命令执行完毕后改回False
+CART_STORAGE_MIGRATING = False
+
+# 登录合并购物车时, 合并后购物车最多保留的商品条数
+CART_MAX_LINES = 100
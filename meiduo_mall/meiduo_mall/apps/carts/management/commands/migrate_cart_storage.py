@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from carts.storage import PackedCartStorage
+
+
+class Command(BaseCommand):
+    """
+    将登录用户的购物车从 cart_<id> + cart_selected_<id> 两个键转换为单个 cart_packed_<id> 键
+
+    迁移步骤:
+    1. 设置 CART_STORAGE_BACKEND = 'packed', CART_STORAGE_MIGRATING = True 并上线, 此时访问到的用户会被顺带转换
+    2. 执行 python manage.py migrate_cart_storage 转换剩余用户
+    3. 设置 CART_STORAGE_MIGRATING = False
+    """
+    help = '将购物车转换为单键存储格式'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='每次SCAN返回的键数量')
+
+    def handle(self, *args, **options):
+        redis_conn = get_redis_connection('cart')
+
+        users = 0
+        lines = 0
+        # SCAN不会阻塞redis, 迁移过程中服务可以正常访问
+        for key in redis_conn.scan_iter(match='cart_*', count=options['batch']):
+            user_id = key.decode()[len('cart_'):]
+            # 跳过 cart_selected_<id> 和 cart_packed_<id>
+            if not user_id.isdigit():
+                continue
+
+            lines += PackedCartStorage(int(user_id), redis_conn).migrate_legacy()
+            users += 1
+
+        self.stdout.write('转换完成: %d 个用户, %d 条购物车记录' % (users, lines))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from carts import constants
 from goods.models import SKU
 
 
@@ -65,3 +66,53 @@ class CartSelectAllSerializer(serializers.Serializer):
     selected = serializers.BooleanField(label='全选')
 
 
+class CartBatchOperationSerializer(serializers.Serializer):
+    """
+    购物车批量操作中的单条操作
+
+    add: 增加数量(与POST /cart/一致)  update: 修改为最终状态(与PUT /cart/一致)  delete: 删除
+    """
+    ACTION_CHOICES = ('add', 'update', 'delete')
+
+    action = serializers.ChoiceField(label='操作类型', choices=ACTION_CHOICES)
+    sku_id = serializers.IntegerField(label='sku id', min_value=1)
+    count = serializers.IntegerField(label='数量', min_value=1, required=False)
+    selected = serializers.BooleanField(label='是否勾选', default=True)
+
+    def validate(self, attrs):
+        if attrs['action'] != 'delete' and 'count' not in attrs:
+            raise serializers.ValidationError('缺少商品数量')
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    购物车批量操作
+
+    所有操作涉及的商品只通过一次 id__in 查询校验, 每条操作单独给出结果, 校验不通过的操作不会执行
+    """
+    operations = CartBatchOperationSerializer(label='操作列表', many=True)
+
+    def validate_operations(self, value):
+        if not value:
+            raise serializers.ValidationError('操作列表不能为空')
+        if len(value) > constants.CART_BATCH_OPERATIONS_LIMIT:
+            raise serializers.ValidationError('单次最多提交%d条操作' % constants.CART_BATCH_OPERATIONS_LIMIT)
+        return value
+
+    def validate(self, attrs):
+        operations = attrs['operations']
+
+        # 一次查询取出所有商品的库存
+        sku_id_list = set(operation['sku_id'] for operation in operations)
+        stocks = dict(SKU.objects.filter(id__in=sku_id_list).values_list('id', 'stock'))
+
+        for operation in operations:
+            if operation['sku_id'] not in stocks:
+                operation['ok'], operation['message'] = False, '商品不存在'
+            elif operation['action'] != 'delete' and operation['count'] > stocks[operation['sku_id']]:
+                operation['ok'], operation['message'] = False, '库存不足'
+            else:
+                operation['ok'], operation['message'] = True, 'OK'
+
+        return attrs
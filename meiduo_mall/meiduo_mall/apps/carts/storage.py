@@ -0,0 +1,327 @@
+"""
+登录用户购物车在redis中的存储方式
+
+1. HashSetCartStorage(原有方式), 每个用户两个键:
+       cart_<user_id>:           hash { sku_id: count }
+       cart_selected_<user_id>:  set  { sku_id, ... }
+
+2. PackedCartStorage, 每个用户一个键, 数量和勾选状态合并保存:
+       cart_packed_<user_id>:    hash { sku_id: count << 1 | selected }
+   读取只需要一次HGETALL, 修改勾选状态只需要一次HSET, 在Redis Cluster中也不存在两个键落在不同slot的问题
+
+写入方法的pl参数可以传入一个管道, 这样多个操作可以在一次往返中完成; 不传时立即执行
+登录合并购物车使用lua脚本在redis中原子完成, 注意HashSetCartStorage的脚本同时操作两个键, 在Redis Cluster中无法保证落在同一个slot
+"""
+from django_redis import get_redis_connection
+
+from carts import constants
+
+
+class BaseCartStorage(object):
+    """
+    购物车存储基类
+    """
+    def __init__(self, user_id, redis_conn=None):
+        self.user_id = user_id
+        self.redis_conn = redis_conn or get_redis_connection('cart')
+
+    def pipeline(self):
+        return self.redis_conn.pipeline()
+
+    def get_cart(self):
+        """
+        获取整个购物车
+        :return: { sku_id: {'count': count, 'selected': selected} }
+        """
+        raise NotImplementedError
+
+    def get_selected(self):
+        """
+        获取勾选的商品
+        :return: { sku_id: count }
+        """
+        return dict((sku_id, item['count']) for sku_id, item in self.get_cart().items() if item['selected'])
+
+    def add(self, sku_id, count, selected, pl=None):
+        """
+        增加商品数量, selected为True时勾选该商品, 为False时不改变原有的勾选状态
+        """
+        raise NotImplementedError
+
+    def update(self, sku_id, count, selected, pl=None):
+        """
+        将商品修改为指定的数量和勾选状态
+        """
+        raise NotImplementedError
+
+    def remove(self, sku_ids, pl=None):
+        """
+        删除商品
+        """
+        raise NotImplementedError
+
+    def select_all(self, selected):
+        """
+        全选或取消全选
+        """
+        raise NotImplementedError
+
+    def merge(self, cookie_cart, stocks, max_lines=constants.CART_MAX_LINES):
+        """
+        在redis中用一个lua脚本原子地合并cookie中的购物车, 并在同一次往返中返回合并后的购物车
+
+        1. 相同商品以cookie为准
+        2. 数量不超过stocks中给出的库存, 库存为0或商品不存在(不在stocks中)的cookie商品不合并
+        3. 合并后商品条数不超过max_lines, 超出的新商品不合并
+        :param cookie_cart: cookie中的购物车
+        :param stocks: { sku_id: stock }
+        :return: 合并后的购物车, 格式同get_cart
+        """
+        args = [max_lines]
+        for sku_id, item in cookie_cart.items():
+            stock = stocks.get(sku_id, 0)
+            count = min(int(item['count']), stock)
+            if count > 0:
+                args.extend([sku_id, count, 1 if item['selected'] else 0])
+        return self.run_merge(args)
+
+    def run_merge(self, args):
+        raise NotImplementedError
+
+    @staticmethod
+    def execute(pl, own_pipeline):
+        if own_pipeline:
+            pl.execute()
+
+
+class HashSetCartStorage(BaseCartStorage):
+    """
+    hash保存数量, set保存勾选状态
+    """
+    # 合并脚本 ARGV: max_lines, sku_id, count, selected, sku_id, count, selected, ...
+    MERGE_SCRIPT = """
+    local max_lines = tonumber(ARGV[1])
+    local lines = redis.call('hlen', KEYS[1])
+    for i = 2, #ARGV, 3 do
+        local exists = redis.call('hexists', KEYS[1], ARGV[i]) == 1
+        if exists or lines < max_lines then
+            if not exists then
+                lines = lines + 1
+            end
+            redis.call('hset', KEYS[1], ARGV[i], ARGV[i + 1])
+            if ARGV[i + 2] == '1' then
+                redis.call('sadd', KEYS[2], ARGV[i])
+            else
+                redis.call('srem', KEYS[2], ARGV[i])
+            end
+        end
+    end
+    return {redis.call('hgetall', KEYS[1]), redis.call('smembers', KEYS[2])}
+    """
+
+    def __init__(self, user_id, redis_conn=None):
+        super().__init__(user_id, redis_conn)
+        self.merge_script = self.redis_conn.register_script(self.MERGE_SCRIPT)
+
+    @property
+    def cart_key(self):
+        return 'cart_%s' % self.user_id
+
+    @property
+    def selected_key(self):
+        return 'cart_selected_%s' % self.user_id
+
+    def get_cart(self):
+        pl = self.pipeline()
+        pl.hgetall(self.cart_key)
+        pl.smembers(self.selected_key)
+        redis_cart, redis_cart_selected = pl.execute()
+
+        cart = {}
+        for sku_id, count in redis_cart.items():
+            cart[int(sku_id)] = {
+                'count': int(count),
+                'selected': sku_id in redis_cart_selected
+            }
+        return cart
+
+    def add(self, sku_id, count, selected, pl=None):
+        own_pipeline = pl is None
+        pl = pl if pl is not None else self.pipeline()
+        pl.hincrby(self.cart_key, sku_id, count)
+        if selected:
+            pl.sadd(self.selected_key, sku_id)
+        self.execute(pl, own_pipeline)
+
+    def update(self, sku_id, count, selected, pl=None):
+        own_pipeline = pl is None
+        pl = pl if pl is not None else self.pipeline()
+        pl.hset(self.cart_key, sku_id, count)
+        if selected:
+            pl.sadd(self.selected_key, sku_id)
+        else:
+            pl.srem(self.selected_key, sku_id)
+        self.execute(pl, own_pipeline)
+
+    def remove(self, sku_ids, pl=None):
+        sku_ids = list(sku_ids)
+        if not sku_ids:
+            return
+        own_pipeline = pl is None
+        pl = pl if pl is not None else self.pipeline()
+        pl.hdel(self.cart_key, *sku_ids)
+        pl.srem(self.selected_key, *sku_ids)
+        self.execute(pl, own_pipeline)
+
+    def select_all(self, selected):
+        sku_ids = self.redis_conn.hkeys(self.cart_key)
+        if not sku_ids:
+            return
+        if selected:
+            self.redis_conn.sadd(self.selected_key, *sku_ids)
+        else:
+            self.redis_conn.srem(self.selected_key, *sku_ids)
+
+    def run_merge(self, args):
+        redis_cart, redis_cart_selected = self.merge_script(keys=[self.cart_key, self.selected_key], args=args)
+        redis_cart_selected = set(redis_cart_selected)
+
+        cart = {}
+        for index in range(0, len(redis_cart), 2):
+            sku_id = redis_cart[index]
+            cart[int(sku_id)] = {
+                'count': int(redis_cart[index + 1]),
+                'selected': sku_id in redis_cart_selected
+            }
+        return cart
+
+
+class PackedCartStorage(BaseCartStorage):
+    """
+    一个hash同时保存数量和勾选状态, 值为 count << 1 | selected
+    """
+    # 增加数量, 勾选时设置最低位, 不勾选时保留原有勾选状态
+    ADD_SCRIPT = """
+    local value = tonumber(redis.call('hget', KEYS[1], ARGV[1]) or '0')
+    local selected = value % 2
+    if ARGV[3] == '1' then
+        selected = 1
+    end
+    local count = math.floor(value / 2) + tonumber(ARGV[2])
+    redis.call('hset', KEYS[1], ARGV[1], count * 2 + selected)
+    return count
+    """
+
+    # 全选/取消全选, 只修改每个值的最低位
+    SELECT_ALL_SCRIPT = """
+    local items = redis.call('hgetall', KEYS[1])
+    for i = 1, #items, 2 do
+        local value = tonumber(items[i + 1])
+        redis.call('hset', KEYS[1], items[i], value - value % 2 + tonumber(ARGV[1]))
+    end
+    return #items / 2
+    """
+
+    # 合并脚本 ARGV: max_lines, sku_id, count, selected, sku_id, count, selected, ...
+    MERGE_SCRIPT = """
+    local max_lines = tonumber(ARGV[1])
+    local lines = redis.call('hlen', KEYS[1])
+    for i = 2, #ARGV, 3 do
+        local exists = redis.call('hexists', KEYS[1], ARGV[i]) == 1
+        if exists or lines < max_lines then
+            if not exists then
+                lines = lines + 1
+            end
+            redis.call('hset', KEYS[1], ARGV[i], tonumber(ARGV[i + 1]) * 2 + tonumber(ARGV[i + 2]))
+        end
+    end
+    return redis.call('hgetall', KEYS[1])
+    """
+
+    # 迁移脚本 KEYS: 单键, 旧的数量hash, 旧的勾选set
+    # 读取旧键, 写入单键(已有的商品以单键为准), 删除旧键在一个脚本中完成, 期间不会插入其他写操作
+    MIGRATE_SCRIPT = """
+    local items = redis.call('hgetall', KEYS[2])
+    for i = 1, #items, 2 do
+        local selected = redis.call('sismember', KEYS[3], items[i])
+        redis.call('hsetnx', KEYS[1], items[i], tonumber(items[i + 1]) * 2 + selected)
+    end
+    redis.call('del', KEYS[2], KEYS[3])
+    return #items / 2
+    """
+
+    def __init__(self, user_id, redis_conn=None):
+        super().__init__(user_id, redis_conn)
+        self.add_script = self.redis_conn.register_script(self.ADD_SCRIPT)
+        self.select_all_script = self.redis_conn.register_script(self.SELECT_ALL_SCRIPT)
+        self.merge_script = self.redis_conn.register_script(self.MERGE_SCRIPT)
+        self.migrate_script = self.redis_conn.register_script(self.MIGRATE_SCRIPT)
+
+    @property
+    def cart_key(self):
+        return 'cart_packed_%s' % self.user_id
+
+    @staticmethod
+    def pack(count, selected):
+        return int(count) << 1 | (1 if selected else 0)
+
+    @staticmethod
+    def unpack(value):
+        value = int(value)
+        return {
+            'count': value >> 1,
+            'selected': bool(value & 1)
+        }
+
+    def get_cart(self):
+        redis_cart = self.redis_conn.hgetall(self.cart_key)
+        return dict((int(sku_id), self.unpack(value)) for sku_id, value in redis_cart.items())
+
+    def add(self, sku_id, count, selected, pl=None):
+        self.add_script(keys=[self.cart_key], args=[sku_id, count, 1 if selected else 0],
+                        client=pl if pl is not None else self.redis_conn)
+
+    def update(self, sku_id, count, selected, pl=None):
+        (pl if pl is not None else self.redis_conn).hset(self.cart_key, sku_id, self.pack(count, selected))
+
+    def remove(self, sku_ids, pl=None):
+        sku_ids = list(sku_ids)
+        if sku_ids:
+            (pl if pl is not None else self.redis_conn).hdel(self.cart_key, *sku_ids)
+
+    def select_all(self, selected):
+        self.select_all_script(keys=[self.cart_key], args=[1 if selected else 0])
+
+    def run_merge(self, args):
+        redis_cart = self.merge_script(keys=[self.cart_key], args=args)
+        return dict((int(redis_cart[i]), self.unpack(redis_cart[i + 1])) for i in range(0, len(redis_cart), 2))
+
+    def migrate_legacy(self):
+        """
+        将该用户原有两个键中的购物车转换到单键格式, 单键中已有的商品以单键为准
+        :return: 转换的商品条数
+        """
+        # note--迁移期间每个请求都会调用, 没有旧键(绝大多数情况)时只执行一次EXISTS
+        legacy = HashSetCartStorage(self.user_id, self.redis_conn)
+        if not self.redis_conn.exists(legacy.cart_key):
+            return 0
+        return int(self.migrate_script(keys=[self.cart_key, legacy.cart_key, legacy.selected_key]))
+
+
+CART_STORAGES = {
+    'hash_set': HashSetCartStorage,
+    'packed': PackedCartStorage,
+}
+
+
+def get_cart_storage(user_id, redis_conn=None):
+    """
+    获取用户购物车的存储对象, 存储方式由constants.CART_STORAGE_BACKEND决定
+    """
+    storage = CART_STORAGES[constants.CART_STORAGE_BACKEND](user_id, redis_conn)
+
+    # 迁移期间, 先把该用户旧格式的购物车转换过来
+    if constants.CART_STORAGE_MIGRATING and isinstance(storage, PackedCartStorage):
+        storage.migrate_legacy()
+
+    return storage
@@ -1,8 +1,6 @@
-import base64
-import pickle
-import redis
-
-from django_redis import get_redis_connection
+from carts.codec import loads_cart
+from carts.storage import get_cart_storage
+from goods.models import SKU
 
 
 # tips--合并购物车工具函数, 在登录的时候即调用此函数
@@ -12,7 +10,7 @@ def merge_cart_cookie_to_redis(request, user, response):
     遇到cookie与redis中出现相同的商品时以cookie数据为主，覆盖redis中的数据
     :param request: 用户的请求对象
     :param user: 当前登录的用户
-    :param response: 响应对象，用于清楚购物车cookie
+    :param response: 响应对象，用于清楚购物车cookie, 合并后的购物车放在响应数据的cart字段中
     :return:
     """
     # 获取cookie中的购物车
@@ -20,41 +18,18 @@ def merge_cart_cookie_to_redis(request, user, response):
     if not cookie_cart:
         return response
 
-    # 解析cookie购物车数据
-    cookie_cart = pickle.loads(base64.b64decode(cookie_cart.encode()))
-
-    # note--合并思路, 将cookie中的数据遍历拆开, 拆成redis的存储类型　set, hash　这两个结构
-    # note--操作redis, 合并字典到hash并去重, 使用hmset　/ 合并数据到set, 直接使用sadd即可, 使用＊args进行解包
-    # 用于保存向redis购物车商品数量hash添加数据的字典
-    cart = {}
-
-    # 记录redis勾选状态中应该增加的sku_id
-    redis_cart_selected_add = []
-
-    # 记录redis勾选状态中应该删除的sku_id
-    redis_cart_selected_remove = []
-
-    # 合并cookie购物车与redis购物车，保存到cart字典中
-    for sku_id, count_selected_dict in cookie_cart.items():
-        # 处理商品数量
-        cart[sku_id] = count_selected_dict['count']
+    # 解析cookie购物车数据, 兼容旧的pickle格式
+    cookie_cart = loads_cart(cookie_cart)
 
-        if count_selected_dict['selected']:
-            redis_cart_selected_add.append(sku_id)
-        else:
-            redis_cart_selected_remove.append(sku_id)
+    # note--合并思路, 将cookie中的数据遍历拆开, 按照redis中的存储格式写入, 相同商品以cookie为主
+    # note--为了避免超过库存, 所以数量不能相加, 而是以cookie为主, 且数量不超过当前库存
+    stocks = dict(SKU.objects.filter(id__in=cookie_cart.keys()).values_list('id', 'stock'))
+    cart = get_cart_storage(user.id).merge(cookie_cart, stocks)
 
-    # note--这里其实无需判断
-    if cart:
-        redis_conn = get_redis_connection('cart')
-        pl = redis_conn.pipeline()
-        pl.hmset('cart_%s' % user.id, cart)
-        if redis_cart_selected_add:
-            # note--为了避免超过库存, 所以数量不能相加, 而是以cookie为主
-            pl.sadd('cart_selected_%s' % user.id, *redis_cart_selected_add)
-        if redis_cart_selected_remove:
-            pl.srem('cart_selected_%s' % user.id, *redis_cart_selected_remove)
-        pl.execute()
+    # 合并脚本已经返回了合并后的购物车, 一并返回给前端, 登录后不需要再查询一次购物车
+    response.data['cart'] = [
+        {'id': sku_id, 'count': item['count'], 'selected': item['selected']} for sku_id, item in cart.items()
+    ]
 
     # note--获取了response对象, 则返回给视图
     # tips--删除语法DRF和django一致
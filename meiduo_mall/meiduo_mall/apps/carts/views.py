@@ -1,17 +1,16 @@
-import base64
-import pickle
-
 import redis
 
 from django.shortcuts import render
-from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from carts import constants
-from carts.serializers import CartSerializer, CartSKUSerializer, CartDeleteSerializer, CartSelectAllSerializer
-from goods.models import SKU
+from carts.codec import loads_cart, dumps_cart
+from carts.storage import get_cart_storage
+from carts.serializers import CartSerializer, CartSKUSerializer, CartDeleteSerializer, CartSelectAllSerializer, \
+    CartBatchSerializer
+from goods.cache import get_sku_cards
 
 
 # tips--购物车增删改查
@@ -38,6 +37,7 @@ class CartView(APIView):
     　　redis保存格式为:
        user_id_sku: { sku_id: count, sku_id, count}
        user_id_selected: { sku_id, sku_id, sku_id}
+       也可以使用单键格式, 见carts.storage
 
     3. 因为全局设置了认证, DRF视图类在进行dispatch()分发前，会对请求进行身份认证、权限检查、流量控制, 始终都会执行
        只要请求携带了设置中设定的身份认证类要求的请求头, 就会进行验证
@@ -89,23 +89,12 @@ class CartView(APIView):
             user = None
         if user is not None and user.is_authenticated:
             # 用户已登录，在redis中保存
-            redis_conn = get_redis_connection('cart')
-            pl = redis_conn.pipeline()
-            # 记录购物车商品数量
-            pl.hincrby('cart_%s' % user.id, sku_id, count)
-            # 记录购物车的勾选项
-            # 勾选
-            if selected:
-                pl.sadd('cart_selected_%s' % user.id, sku_id)
-            pl.execute()
+            # 记录购物车商品数量和勾选项
+            get_cart_storage(user.id).add(sku_id, count, selected)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             # 用户未登录保存在cookie
-            cart = request.COOKIES.get('cart')
-            if cart is not None:
-                cart = pickle.loads(base64.b64decode(cart.encode()))
-            else:
-                cart = {}
+            cart = loads_cart(request.COOKIES.get('cart'))
 
             sku = cart.get(sku_id)
             if sku:
@@ -116,7 +105,7 @@ class CartView(APIView):
                 'selected': selected
             }
 
-            cookie_cart = base64.b64encode(pickle.dumps(cart)).decode()
+            cookie_cart = dumps_cart(cart)
 
             response = Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -136,31 +125,17 @@ class CartView(APIView):
         # 必须同时检查认证状态和是否存在
         if user is not None and user.is_authenticated:
             # 用户已登录，从redis中读取
-            redis_conn = get_redis_connection('cart')
-            redis_cart = redis_conn.hgetall('cart_%s' % user.id)
-            redis_cart_selected = redis_conn.smembers('cart_selected_%s' % user.id)
-            cart = {}
-            for sku_id, count in redis_cart.items():
-                print(sku_id)
-                print(count)
-                cart[int(sku_id)] = {
-                    'count': int(count),
-                    'selected': sku_id in redis_cart_selected
-                }
+            cart = get_cart_storage(user.id).get_cart()
         else:
             # 用户未登录，从cookie中读取
-            cart = request.COOKIES.get('cart')
-            if cart is not None:
-                cart = pickle.loads(base64.b64decode(cart.encode()))
-            else:
-                cart = {}
-
-        # 获取查询集并进行序列化
-        skus = SKU.objects.filter(id__in=cart.keys())
+            cart = loads_cart(request.COOKIES.get('cart'))
+
+        # 从缓存中获取商品卡片并进行序列化
+        skus = list(get_sku_cards(cart.keys()).values())
         # 此时SKU不包含数量和勾选状态, 需要手动添加
         for sku in skus:
-            sku.count = cart[sku.id]['count']
-            sku.selected = cart[sku.id]['selected']
+            sku['count'] = cart[sku['id']]['count']
+            sku['selected'] = cart[sku['id']]['selected']
 
         serializer = CartSKUSerializer(skus, many=True)
         return Response(serializer.data)
@@ -184,29 +159,17 @@ class CartView(APIView):
 
         if user is not None and user.is_authenticated:
             # 用户已登录，在redis中保存
-            redis_conn = get_redis_connection('cart')
-            pl = redis_conn.pipeline()
-            pl.hset('cart_%s' % user.id, sku_id, count)
-            if selected:
-                pl.sadd('cart_selected_%s' % user.id, sku_id)
-            else:
-                pl.srem('cart_selected_%s' % user.id, sku_id)
-            pl.execute()
+            get_cart_storage(user.id).update(sku_id, count, selected)
             return Response(serializer.data)
         else:
             # 用户未登录，在cookie中保存
-            # 使用pickle序列化购物车数据，pickle操作的是bytes类型
-            cart = request.COOKIES.get('cart')
-            if cart is not None:
-                cart = pickle.loads(base64.b64decode(cart.encode()))
-            else:
-                cart = {}
+            cart = loads_cart(request.COOKIES.get('cart'))
 
             cart[sku_id] = {
                 'count': count,
                 'selected': selected
             }
-            cookie_cart = base64.b64encode(pickle.dumps(cart)).decode()
+            cookie_cart = dumps_cart(cart)
 
             response = Response(serializer.data)
             # 设置购物车的cookie
@@ -229,31 +192,108 @@ class CartView(APIView):
 
         if user is not None and user.is_authenticated:
             # 用户已登录，在redis中保存
-            redis_conn = get_redis_connection('cart')
-            pl = redis_conn.pipeline()
-            pl.hdel('cart_%s' % user.id, sku_id)
-            pl.srem('cart_selected_%s' % user.id, sku_id)
-            pl.execute()
+            get_cart_storage(user.id).remove([sku_id])
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             # 用户未登录，在cookie中保存
             response = Response(status=status.HTTP_204_NO_CONTENT)
 
-            # 使用pickle序列化购物车数据，pickle操作的是bytes类型
-            cart = request.COOKIES.get('cart')
+            cart = loads_cart(request.COOKIES.get('cart'))
 
             # 不存在则直接返回
-            if cart is not None:
-                cart = pickle.loads(base64.b64decode(cart.encode()))
+            if cart:
                 if sku_id in cart:
                     del cart[sku_id]
-                    cookie_cart = base64.b64encode(pickle.dumps(cart)).decode()
+                    cookie_cart = dumps_cart(cart)
                     # 设置购物车的cookie
                     # 需要设置有效期，否则是临时cookie
                     response.set_cookie('cart', cookie_cart, max_age=constants.CART_COOKIE_EXPIRES)
             return response
 
 
+# tips--购物车批量修改
+class CartBatchView(APIView):
+    """
+    购物车批量增删改
+
+    请求方式: POST /cart/batch/
+    请求参数: {"operations": [{"action": "add/update/delete", "sku_id": 1, "count": 2, "selected": true}, ...]}
+    返回数据: 每条操作的执行结果
+
+    前端连续点击数量加减时可以合并成一次请求, 所有商品一次查询校验, redis操作在一个管道中完成
+    """
+    def perform_authentication(self, request):
+        pass
+
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+
+        try:
+            user = request.user
+        except Exception:
+            user = None
+
+        results = []
+        if user is not None and user.is_authenticated:
+            # 用户已登录，所有操作放在一个管道中执行
+            storage = get_cart_storage(user.id)
+            pl = storage.pipeline()
+            for operation in operations:
+                results.append(self.build_result(operation))
+                if not operation['ok']:
+                    continue
+                sku_id = operation['sku_id']
+                if operation['action'] == 'delete':
+                    storage.remove([sku_id], pl)
+                elif operation['action'] == 'add':
+                    storage.add(sku_id, operation['count'], operation['selected'], pl)
+                else:
+                    storage.update(sku_id, operation['count'], operation['selected'], pl)
+            pl.execute()
+            return Response({'results': results})
+        else:
+            # 用户未登录，依次修改cookie中的购物车
+            cart = loads_cart(request.COOKIES.get('cart'))
+
+            for operation in operations:
+                results.append(self.build_result(operation))
+                if not operation['ok']:
+                    continue
+                sku_id = operation['sku_id']
+                if operation['action'] == 'delete':
+                    cart.pop(sku_id, None)
+                    continue
+
+                count = operation['count']
+                if operation['action'] == 'add' and sku_id in cart:
+                    count += int(cart[sku_id]['count'])
+                cart[sku_id] = {
+                    'count': count,
+                    'selected': operation['selected']
+                }
+
+            response = Response({'results': results})
+            cookie_cart = dumps_cart(cart)
+            response.set_cookie('cart', cookie_cart, max_age=constants.CART_COOKIE_EXPIRES)
+            return response
+
+    @staticmethod
+    def build_result(operation):
+        """
+        单条操作的返回结果
+        """
+        return {
+            'action': operation['action'],
+            'sku_id': operation['sku_id'],
+            'count': operation.get('count'),
+            'selected': operation['selected'],
+            'ok': operation['ok'],
+            'message': operation['message'],
+        }
+
+
 # tips--购物车全选与否
 class CartSelectAllView(APIView):
     """
@@ -278,33 +318,18 @@ class CartSelectAllView(APIView):
 
         if user is not None and user.is_authenticated:
             # 用户已登录，在redis中保存
-            redis_conn = get_redis_connection('cart')
-            cart = redis_conn.hgetall('cart_%s' % user.id)
-            sku_id_list = cart.keys()
-
-            # print(cart)
-            # print(redis_conn.smembers('cart_selected_%s' % user.id))
-            # note--b'num'转化成正常的数字
-            # print(int(b'10'))
-
-            if selected:
-                # 全选
-                redis_conn.sadd('cart_selected_%s' % user.id, *sku_id_list)
-            else:
-                # 取消全选
-                redis_conn.srem('cart_selected_%s' % user.id, *sku_id_list)
+            get_cart_storage(user.id).select_all(selected)
             return Response({'message': 'OK'})
         else:
             # cookie
-            cart = request.COOKIES.get('cart')
+            cart = loads_cart(request.COOKIES.get('cart'))
 
             response = Response({'message': 'OK'})
 
-            if cart is not None:
-                cart = pickle.loads(base64.b64decode(cart.encode()))
+            if cart:
                 for sku_id in cart:
                     cart[sku_id]['selected'] = selected
-                cookie_cart = base64.b64encode(pickle.dumps(cart)).decode()
+                cookie_cart = dumps_cart(cart)
                 # 设置购物车的cookie
                 # 需要设置有效期，否则是临时cookie
                 response.set_cookie('cart', cookie_cart, max_age=constants.CART_COOKIE_EXPIRES)
@@ -1,10 +1,8 @@
-from collections import OrderedDict
-from django.conf import settings
 from django.template import loader
-import os
 import time
 
-from goods.models import GoodsChannel
+from goods.utils import get_categories
+from meiduo_mall.utils.static_html import write_static_html, queue_cdn_purge
 from .models import ContentCategory
 
 
@@ -14,38 +12,7 @@ def generate_static_index_html():
     """
     print('%s: generate_static_index_html' % time.ctime())
     # 商品频道及分类菜单
-    # 使用有序字典保存类别的顺序
-    # categories = {
-    #     1: { # 组1
-    #         'channels': [{'id':, 'name':, 'url':},{}, {}...],
-    #         'sub_cats': [{'id':, 'name':, 'sub_cats':[{},{}]}, {}, {}, ..]
-    #     },
-    #     2: { # 组2
-    #
-    #     }
-    # }
-    categories = OrderedDict()
-    channels = GoodsChannel.objects.order_by('group_id', 'sequence')
-    for channel in channels:
-        group_id = channel.group_id  # 当前组
-
-        if group_id not in categories:
-            categories[group_id] = {'channels': [], 'sub_cats': []}
-
-        cat1 = channel.category  # 当前频道的类别
-
-        # 追加当前频道
-        categories[group_id]['channels'].append({
-            'id': cat1.id,
-            'name': cat1.name,
-            'url': channel.url
-        })
-        # 构建当前类别的子类别
-        for cat2 in cat1.goodscategory_set.all():
-            cat2.sub_cats = []
-            for cat3 in cat2.goodscategory_set.all():
-                cat2.sub_cats.append(cat3)
-            categories[group_id]['sub_cats'].append(cat2)
+    categories = get_categories()
 
     # 广告内容
     contents = {}
@@ -60,6 +27,5 @@ def generate_static_index_html():
     }
     template = loader.get_template('index.html')
     html_text = template.render(context)
-    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, 'index.html')
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(html_text)
+    if write_static_html('index.html', html_text):
+        queue_cdn_purge(['index.html'])
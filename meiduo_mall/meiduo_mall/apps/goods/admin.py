@@ -6,28 +6,28 @@ from . import models
 class SKUAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.save()
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(obj.id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(obj.goods_id)
 
 
 class SKUSpecificationAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.save()
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(obj.sku.id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(obj.sku.goods_id)
 
     def delete_model(self, request, obj):
-        sku_id = obj.sku.id
+        goods_id = obj.sku.goods_id
         obj.delete()
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(sku_id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(goods_id)
 
 
 class SKUImageAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.save()
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(obj.sku.id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(obj.sku.goods_id)
 
         # 设置SKU默认图片
         sku = obj.sku
@@ -36,10 +36,10 @@ class SKUImageAdmin(admin.ModelAdmin):
             sku.save()
 
     def delete_model(self, request, obj):
-        sku_id = obj.sku.id
+        goods_id = obj.sku.goods_id
         obj.delete()
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(sku_id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(goods_id)
 
 
 admin.site.register(models.GoodsCategory)
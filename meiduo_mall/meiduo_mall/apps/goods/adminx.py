@@ -29,18 +29,18 @@ class SKUSpecificationAdmin(object):
         obj.save()
 
         # 补充自定义行为
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(obj.sku.id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(obj.sku.goods_id)
 
     def delete_model(self):
         # 删除数据对象
         obj = self.obj
-        sku_id = obj.sku.id
+        goods_id = obj.sku.goods_id
         obj.delete()
 
         # 补充自定义行为
-        from celery_tasks.html import generate_static_sku_detail_html
-        generate_static_sku_detail_html.delay(sku_id)
+        from celery_tasks.html import schedule_goods_detail_html
+        schedule_goods_detail_html(goods_id)
 
 
 xadmin.site.register(models.GoodsCategory)
@@ -5,3 +5,7 @@ class GoodsConfig(AppConfig):
 
     name = 'goods'
     verbose_name = '商品管理'
+
+    def ready(self):
+        # 注册信号处理函数
+        from goods import signals
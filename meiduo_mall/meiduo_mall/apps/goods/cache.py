@@ -0,0 +1,127 @@
+"""
+SKU卡片缓存
+
+购物车, 订单结算, 浏览历史, 搜索结果都只需要SKU的几个基本字段, 将这些字段组成卡片缓存起来:
+1. 进程内LRU缓存
+2. redis中每个SKU一个键 sku_card_<sku_id>, 值为json, 批量读取使用MGET
+3. 都未命中时一次查询数据库, 并回填缓存
+
+卡片是普通字典, 可以直接交给SKUSerializer等序列化器使用
+商品修改后由goods.signals中的信号处理函数清除缓存
+
+分类商品列表的总数和列表响应也缓存在redis中, 避免每次翻页都执行COUNT(*)和列表查询:
+    category_skus_version_<分类id>:          string 分类的版本号, 该分类的SKU修改后递增, 该分类的缓存一起失效
+    category_sku_count_<版本号>_<分类id>:    string 该分类上架的SKU数量
+    sku_list_<分类id>_<版本号>_<参数摘要>:    string 列表响应, 见goods.views.sku_list_cache_key
+"""
+import json
+
+from django.db import router
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU
+from meiduo_mall.utils.local_cache import LRUCache
+
+
+# 卡片包含的字段
+SKU_CARD_FIELDS = ('id', 'name', 'price', 'default_image_url', 'comments', 'weight')
+
+local_sku_cards = LRUCache(constants.SKU_CARD_LOCAL_CACHE_SIZE, constants.SKU_CARD_LOCAL_CACHE_EXPIRES)
+
+
+def sku_card_key(sku_id):
+    # note--卡片字段变化时修改键名, 旧格式的卡片不再被读取, 等待自然过期
+    return 'sku_card_v2_%s' % sku_id
+
+
+def get_sku_cards(sku_ids):
+    """
+    批量获取SKU卡片
+    :param sku_ids: sku_id列表, 可以是bytes/str/int
+    :return: { sku_id: card }, 按sku_ids的顺序排列, 不存在的商品不在结果中, 返回的卡片可以随意修改
+    """
+    sku_ids = [int(sku_id) for sku_id in sku_ids]
+    cards = dict.fromkeys(sku_ids)
+
+    # 进程内缓存
+    missing = []
+    for sku_id in cards:
+        card = local_sku_cards.get(sku_id)
+        if card is None:
+            missing.append(sku_id)
+        else:
+            cards[sku_id] = card
+
+    # redis缓存
+    if missing:
+        redis_conn = get_redis_connection('goods')
+        values = redis_conn.mget([sku_card_key(sku_id) for sku_id in missing])
+        not_cached = []
+        for sku_id, value in zip(missing, values):
+            if value is None:
+                not_cached.append(sku_id)
+            else:
+                cards[sku_id] = json.loads(value.decode())
+                local_sku_cards.set(sku_id, cards[sku_id])
+
+        # 数据库
+        # note--从主库读取: 修改商品后清除了缓存, 从库延迟时会读到修改前的数据并缓存SKU_CARD_REDIS_EXPIRES
+        if not_cached:
+            pl = redis_conn.pipeline()
+            skus = SKU.objects.using(router.db_for_write(SKU)).filter(id__in=not_cached)
+            for card in skus.values(*SKU_CARD_FIELDS):
+                card['price'] = str(card['price'])
+                card['weight'] = str(card['weight'])
+                cards[card['id']] = card
+                local_sku_cards.set(card['id'], card)
+                pl.setex(sku_card_key(card['id']), constants.SKU_CARD_REDIS_EXPIRES, json.dumps(card))
+            pl.execute()
+
+    # 缓存中的卡片是共享的, 返回副本
+    return dict((sku_id, dict(card)) for sku_id, card in cards.items() if card is not None)
+
+
+def delete_sku_cards(sku_ids):
+    """
+    清除SKU卡片缓存, 其他进程中的进程内缓存只能等待过期
+    """
+    sku_ids = list(sku_ids)
+    if not sku_ids:
+        return
+    for sku_id in sku_ids:
+        local_sku_cards.delete(int(sku_id))
+    get_redis_connection('goods').delete(*[sku_card_key(sku_id) for sku_id in sku_ids])
+
+
+def category_version_key(category_id):
+    return 'category_skus_version_%s' % category_id
+
+
+def get_category_version(category_id, redis_conn=None):
+    redis_conn = redis_conn or get_redis_connection('goods')
+    return int(redis_conn.get(category_version_key(category_id)) or 0)
+
+
+def bump_category_versions(category_ids):
+    """
+    SKU修改后使所在分类的总数和列表缓存失效
+    """
+    pl = get_redis_connection('goods').pipeline()
+    for category_id in category_ids:
+        pl.incr(category_version_key(category_id))
+    pl.execute()
+
+
+def get_category_sku_count(category_id):
+    """
+    分类中上架的SKU数量
+    """
+    redis_conn = get_redis_connection('goods')
+    key = 'category_sku_count_%s_%s' % (get_category_version(category_id, redis_conn), category_id)
+    count = redis_conn.get(key)
+    if count is None:
+        # note--从主库统计, 从库延迟时统计到的旧数量会按新的版本号缓存, 直到过期都不会更新
+        count = SKU.objects.using(router.db_for_write(SKU)).filter(category_id=category_id, is_launched=True).count()
+        redis_conn.setex(key, constants.CATEGORY_SKU_COUNT_EXPIRES, count)
+    return int(count)
@@ -0,0 +1,43 @@
+
+# redis中SKU卡片缓存有效期
+SKU_CARD_REDIS_EXPIRES = 60 * 60
+
+# 进程内SKU卡片缓存的最大条数
+SKU_CARD_LOCAL_CACHE_SIZE = 2000
+
+# 进程内SKU卡片缓存有效期, 其他进程修改商品后无法通知到本进程, 所以设置得很短
+SKU_CARD_LOCAL_CACHE_EXPIRES = 5
+
+# redis中分类商品总数的缓存有效期
+CATEGORY_SKU_COUNT_EXPIRES = 10 * 60
+
+# 分类商品列表响应的缓存有效期, 修改商品会使缓存立即失效, 按销量排序的结果最多延迟这么久
+SKU_LIST_CACHE_EXPIRES = 5 * 60
+
+# 每次合并的商品销量增量条数
+SALES_FLUSH_BATCH = 1000
+
+# 合并商品销量时持有的锁的有效期, 持有锁的进程崩溃时, 超过该时间后其他进程可以重新合并
+SALES_FLUSH_LOCK_EXPIRES = 10 * 60
+
+# redis中商品分类菜单缓存有效期, 每个版本号一个缓存
+CATEGORIES_REDIS_EXPIRES = 24 * 60 * 60
+
+# 进程内商品分类菜单缓存有效期, 每次读取都会检查版本号, 所以可以设置得较长
+CATEGORIES_LOCAL_CACHE_EXPIRES = 10 * 60
+
+# 增量生成静态详情页面时, 从上次开始生成的时间再向前多取的秒数, 避免漏掉事务提交较晚的修改
+DETAIL_HTML_WATERMARK_OVERLAP = 5 * 60
+
+# 商品修改后延迟生成详情页面的秒数, 期间对同一商品的多次修改只生成一次
+DETAIL_HTML_DEBOUNCE = 10
+
+# 已安排生成任务的标记有效期, 任务丢失时超过该时间后的修改会重新安排
+DETAIL_HTML_FLUSH_SCHEDULED_EXPIRES = 60
+
+# 生成一个SPU页面时持有的锁的有效期
+DETAIL_HTML_LOCK_EXPIRES = 60
+
+# 有SPU详情页面生成失败时, 合并生成任务的重试间隔(秒)和最多重试次数
+DETAIL_HTML_RETRY_DELAY = 60
+DETAIL_HTML_FLUSH_MAX_RETRIES = 5
@@ -0,0 +1,154 @@
+import datetime
+import os
+import re
+import time
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from celery_tasks.html import render_goods_detail_html_locked, schedule_goods_detail_html, sku_detail_html_path
+from goods import constants
+from goods.models import Goods, SKU, SKUImage, SKUSpecification, GoodsSpecification, SpecificationOption
+from goods.utils import get_categories, CATEGORIES_VERSION_KEY
+from meiduo_mall.utils.static_html import delete_static_html, queue_cdn_purge
+
+
+# 上次成功生成的时间和分类菜单版本号
+#   detail_html_watermark:  hash {time: 开始生成的时间, categories_version: 分类菜单版本号}
+WATERMARK_KEY = 'detail_html_watermark'
+
+# 商品详情页面的文件名
+SKU_DETAIL_HTML_RE = re.compile(r'^(\d+)\.html$')
+
+# 子进程共用的分类菜单, 由主进程查询一次后传入
+shared_categories = None
+
+
+def init_worker(categories):
+    global shared_categories
+    shared_categories = categories
+
+
+def render(goods_id):
+    """
+    在子进程中生成一个SPU的所有页面, 与celery任务一样持有该SPU的锁
+    :return: (goods_id, 页面数量, 内容有变化的页面数量, 是否有其他进程正在生成, 错误信息)
+    """
+    try:
+        result = render_goods_detail_html_locked(goods_id, shared_categories)
+    except Exception as e:
+        return goods_id, 0, 0, False, '%s: %s' % (type(e).__name__, e)
+    if result is None:
+        return goods_id, 0, 0, True, None
+    generated, changed = result
+    return goods_id, len(generated), len(changed), False, None
+
+
+def changed_goods_ids(since):
+    """
+    since之后商品, SKU, SKU图片和规格, 商品规格和选项有修改的SPU
+    """
+    goods_ids = set(Goods.objects.filter(update_time__gte=since).values_list('id', flat=True))
+    goods_ids.update(SKU.objects.filter(update_time__gte=since).values_list('goods_id', flat=True))
+    goods_ids.update(SKUImage.objects.filter(update_time__gte=since).values_list('sku__goods_id', flat=True))
+    goods_ids.update(SKUSpecification.objects.filter(update_time__gte=since).values_list('sku__goods_id', flat=True))
+    goods_ids.update(GoodsSpecification.objects.filter(update_time__gte=since).values_list('goods_id', flat=True))
+    goods_ids.update(SpecificationOption.objects.filter(update_time__gte=since).values_list('spec__goods_id', flat=True))
+    return sorted(goods_ids)
+
+
+def remove_stale_pages():
+    """
+    删除已删除或已下架的SKU的页面
+    :return: 删除的sku_id列表
+    """
+    # note--先列出文件再从主库查询上架的SKU, 列出之后新上架的SKU的页面不在列表中, 不会被误删
+    page_ids = []
+    for name in os.listdir(os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, 'goods')):
+        match = SKU_DETAIL_HTML_RE.match(name)
+        if match:
+            page_ids.append(int(match.group(1)))
+    launched_ids = set(SKU.objects.using(router.db_for_write(SKU)).filter(is_launched=True).values_list('id', flat=True))
+
+    removed = [sku_id for sku_id in page_ids
+               if sku_id not in launched_ids and delete_static_html(sku_detail_html_path(sku_id))]
+    queue_cdn_purge(sku_detail_html_path(sku_id) for sku_id in removed)
+    return removed
+
+
+class Command(BaseCommand):
+    """
+    多进程重新生成静态商品详情页面, 默认只生成上次成功生成之后有修改的SPU
+    分类或频道修改后(分类菜单版本号变化)所有页面的菜单都变了, 重新生成全部页面
+    其他进程正在生成的SPU交给celery稍后生成; 已删除或已下架的SKU的页面每次都会清除
+    note--update_time在事务提交前设置, 起点向前多取DETAIL_HTML_WATERMARK_OVERLAP秒, 避免漏掉提交较晚的修改
+    """
+    help = '重新生成静态商品详情页面'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='生成全部页面')
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help='进程数')
+        parser.add_argument('--chunk-size', type=int, default=20, help='每次分配给子进程的SPU数量')
+
+    def handle(self, *args, **options):
+        redis_conn = get_redis_connection('goods')
+        started = timezone.now()
+
+        # 先读版本号再取菜单, 期间菜单又被修改时, 下次执行会重新生成全部页面
+        categories_version = redis_conn.get(CATEGORIES_VERSION_KEY) or b'0'
+        categories = get_categories()
+
+        watermark = redis_conn.hgetall(WATERMARK_KEY)
+        if options['all'] or not watermark:
+            goods_ids = list(Goods.objects.order_by('id').values_list('id', flat=True))
+            self.stdout.write('生成全部页面: %d 个SPU' % len(goods_ids))
+        elif watermark.get(b'categories_version') != categories_version:
+            goods_ids = list(Goods.objects.order_by('id').values_list('id', flat=True))
+            self.stdout.write('分类菜单已修改, 生成全部页面: %d 个SPU' % len(goods_ids))
+        else:
+            since = parse_datetime(watermark[b'time'].decode())
+            since -= datetime.timedelta(seconds=constants.DETAIL_HTML_WATERMARK_OVERLAP)
+            goods_ids = changed_goods_ids(since)
+            self.stdout.write('%s 之后修改的SPU: %d 个' % (timezone.localtime(since), len(goods_ids)))
+
+        # fork之前关闭数据库连接, 子进程各自重新连接
+        connections.close_all()
+        pool = Pool(options['processes'], initializer=init_worker, initargs=(categories,))
+
+        start = time.perf_counter()
+        pages = 0
+        changed_pages = 0
+        failed = []
+        busy = []
+        results = pool.imap_unordered(render, goods_ids, chunksize=options['chunk_size'])
+        for index, (goods_id, count, changed_count, locked, error) in enumerate(results, 1):
+            pages += count
+            changed_pages += changed_count
+            if locked:
+                busy.append(goods_id)
+                schedule_goods_detail_html(goods_id)
+            if error is not None:
+                failed.append(goods_id)
+                self.stderr.write('SPU %s 生成失败: %s' % (goods_id, error))
+            if index % 1000 == 0:
+                self.stdout.write('已完成 %d/%d 个SPU, %d 个页面, %.1f 页/秒' % (
+                    index, len(goods_ids), pages, pages / (time.perf_counter() - start)))
+        pool.close()
+        pool.join()
+        elapsed = time.perf_counter() - start
+
+        removed = remove_stale_pages()
+
+        # 全部成功才推进水位, 失败的SPU下次重新生成
+        if not failed:
+            redis_conn.hmset(WATERMARK_KEY, {'time': started.isoformat(), 'categories_version': categories_version})
+
+        self.stdout.write('完成: %d 个SPU, %d 个页面(内容有变化 %d 个), 失败 %d 个SPU, 交给celery %d 个SPU, '
+                          '删除 %d 个页面, 耗时 %.1f 秒, %.1f 页/秒' % (
+                              len(goods_ids), pages, changed_pages, len(failed), len(busy), len(removed),
+                              elapsed, pages / elapsed if elapsed else 0))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku_id', models.IntegerField(verbose_name='sku id')),
+                ('goods_id', models.IntegerField(verbose_name='商品id')),
+                ('count', models.IntegerField(verbose_name='销量增量')),
+            ],
+            options={
+                'verbose_name': '商品销量增量',
+                'verbose_name_plural': '商品销量增量',
+                'db_table': 'tb_sales_delta',
+            },
+        ),
+    ]
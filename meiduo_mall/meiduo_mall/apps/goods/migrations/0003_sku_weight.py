@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0002_salesdelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sku',
+            name='weight',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=10, verbose_name='重量(kg)'),
+        ),
+    ]
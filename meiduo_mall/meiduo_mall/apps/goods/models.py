@@ -126,6 +126,7 @@ class SKU(BaseModel):
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='进价')
     market_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='市场价')
     stock = models.IntegerField(default=0, verbose_name='库存')
+    weight = models.DecimalField(max_digits=10, decimal_places=3, default=0, verbose_name='重量(kg)')
     sales = models.IntegerField(default=0, verbose_name='销量')
     comments = models.IntegerField(default=0, verbose_name='评价数')
     is_launched = models.BooleanField(default=True, verbose_name='是否上架销售')
@@ -135,6 +136,12 @@ class SKU(BaseModel):
         db_table = 'tb_sku'
         verbose_name = '商品SKU'
         verbose_name_plural = verbose_name
+        # note--分类商品列表的每种排序各一个索引, 游标翻页时只读取一页的数据
+        indexes = [
+            models.Index(fields=['category', 'is_launched', 'create_time', 'id'], name='sku_list_create_time_idx'),
+            models.Index(fields=['category', 'is_launched', 'price', 'id'], name='sku_list_price_idx'),
+            models.Index(fields=['category', 'is_launched', 'sales', 'id'], name='sku_list_sales_idx'),
+        ]
 
     def __str__(self):
         return '%s: %s' % (self.id, self.name)
@@ -171,3 +178,18 @@ class SKUSpecification(BaseModel):
 
     def __str__(self):
         return '%s: %s - %s' % (self.sku, self.spec.name, self.option.value)
+
+
+class SalesDelta(models.Model):
+    """
+    商品销量增量, 下单和取消订单时在订单事务中插入, 定时合并到SKU和SPU的销量
+    note--只插入不更新, 下单时不再需要锁定商品SPU的行
+    """
+    sku_id = models.IntegerField(verbose_name='sku id')
+    goods_id = models.IntegerField(verbose_name='商品id')
+    count = models.IntegerField(verbose_name='销量增量')
+
+    class Meta:
+        db_table = 'tb_sales_delta'
+        verbose_name = '商品销量增量'
+        verbose_name_plural = verbose_name
@@ -0,0 +1,28 @@
+from functools import partial
+
+from goods.cache import get_category_sku_count
+from meiduo_mall.utils.pagination import StandardResultsSetPagination, OrderingKeysetPagination, CountedPaginator
+
+
+class SKUListPagination(StandardResultsSetPagination):
+    """
+    分类商品列表分页
+    1. 默认按页码分页, 总数从缓存读取, 不再每页执行COUNT(*)
+    2. 请求中带有cursor参数(第一页为空字符串)时使用游标分页, 返回 {next, results}, 翻到后面的页也不需要OFFSET扫描
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if OrderingKeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = OrderingKeysetPagination()
+            self.keyset.page_size = self.page_size
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        count = get_category_sku_count(view.kwargs['category_id'])
+        self.django_paginator_class = partial(CountedPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,89 @@
+"""
+商品销量计数
+
+下单/取消订单时不直接更新 tb_sku.sales 和 tb_goods.sales, 而是在订单事务中向 tb_sales_delta 插入增量,
+同一SPU的多个订单不会在tb_goods的同一行上排队; 定时任务把增量合并到销量中
+
+增量与订单在同一事务中插入, 合并时在同一事务中更新销量并删除增量, 任何一步中断都不会丢失或重复计数
+同一时间只有一个进程合并, 由redis中的锁保证:
+    sales_flush_lock:  string 正在合并的进程持有的锁, 值为该进程的随机token
+"""
+from collections import defaultdict
+
+from django.db import transaction, router
+from django.db.models import F
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU, Goods, SalesDelta
+from meiduo_mall.utils.models import case_by_id
+from meiduo_mall.utils.redis_lock import acquire_lock, release_lock
+
+
+SALES_FLUSH_LOCK_KEY = 'sales_flush_lock'
+
+
+def record_sales(lines):
+    """
+    记录销量增量, 需要在订单事务中调用
+    :param lines: [(sku_id, goods_id, count)], 取消订单时count为负数
+    """
+    SalesDelta.objects.bulk_create([
+        SalesDelta(sku_id=sku_id, goods_id=goods_id, count=count) for sku_id, goods_id, count in lines if count
+    ])
+
+
+def flush_sales_batch(batch):
+    """
+    合并最早的一批增量, 调用方需要持有SALES_FLUSH_LOCK_KEY锁
+    :return: 合并的增量条数
+    """
+    db = router.db_for_write(SalesDelta)
+    with transaction.atomic(using=db):
+        # note--不使用select_for_update: REPEATABLE READ下读到表尾时会加next-key锁直到supremum,
+        # note--阻塞下单事务插入新的增量; 只有一个进程合并, 普通的一致性读就足够了
+        # 先确定本批的id上限, 再读取这个范围内的增量
+        ids = list(SalesDelta.objects.using(db).order_by('id').values_list('id', flat=True)[:batch])
+        if not ids:
+            return 0
+        deltas = list(SalesDelta.objects.using(db).filter(id__lte=ids[-1]).values_list(
+            'id', 'sku_id', 'goods_id', 'count'))
+
+        sku_sales = defaultdict(int)
+        goods_sales = defaultdict(int)
+        for _, sku_id, goods_id, count in deltas:
+            sku_sales[sku_id] += count
+            goods_sales[goods_id] += count
+
+        sku_sales = dict((sku_id, count) for sku_id, count in sku_sales.items() if count)
+        goods_sales = dict((goods_id, count) for goods_id, count in goods_sales.items() if count)
+        if sku_sales:
+            SKU.objects.filter(id__in=sku_sales.keys()).update(sales=F('sales') + case_by_id(sku_sales))
+        if goods_sales:
+            Goods.objects.filter(id__in=goods_sales.keys()).update(sales=F('sales') + case_by_id(goods_sales))
+
+        # note--按读到的id删除, 自增id不按提交顺序可见, 范围内读取之后才提交的增量留到下次合并
+        SalesDelta.objects.using(db).filter(id__in=[delta[0] for delta in deltas]).delete()
+        return len(deltas)
+
+
+def flush_sales(batch=constants.SALES_FLUSH_BATCH):
+    """
+    合并所有的增量
+    :return: 合并的增量条数, 其他进程正在合并时返回None
+    """
+    redis_conn = get_redis_connection('goods')
+    token = acquire_lock(redis_conn, SALES_FLUSH_LOCK_KEY, constants.SALES_FLUSH_LOCK_EXPIRES)
+    if token is None:
+        return None
+
+    try:
+        total = 0
+        while True:
+            count = flush_sales_batch(batch)
+            total += count
+            if count < batch:
+                return total
+    finally:
+        # note--合并时间超过锁的有效期时, 锁可能已经被其他进程获得, 只释放自己的锁
+        release_lock(redis_conn, SALES_FLUSH_LOCK_KEY, token)
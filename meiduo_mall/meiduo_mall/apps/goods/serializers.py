@@ -1,6 +1,7 @@
 from drf_haystack.serializers import HaystackSerializer
 from rest_framework import serializers
 
+from goods.cache import get_sku_cards
 from goods.models import SKU
 from goods.search_indexes import SKUIndex
 
@@ -17,8 +18,20 @@ class SKUSerializer(serializers.ModelSerializer):
 class SKUIndexSerializer(HaystackSerializer):
     """
     SKU索引结果数据序列化器
+
+    搜索结果的object默认会逐条查询数据库, 这里改为使用缓存的SKU卡片,
+    视图会把整页结果的卡片一次取出放在context['sku_cards']中
     """
-    object = SKUSerializer(read_only=True)
+    object = serializers.SerializerMethodField()
+
+    def get_object(self, obj):
+        cards = self.context.get('sku_cards')
+        if cards is None:
+            cards = get_sku_cards([obj.pk])
+        card = cards.get(int(obj.pk))
+        if card is None:
+            return None
+        return SKUSerializer(card).data
 
     class Meta:
         index_classes = [SKUIndex]
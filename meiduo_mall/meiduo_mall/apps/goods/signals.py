@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from goods.cache import delete_sku_cards, bump_category_versions
+from goods.models import SKU, SKUImage, GoodsCategory, GoodsChannel
+from goods.utils import bump_categories_version
+
+
+# tips--商品数据修改后清除缓存
+# note--admin和xadmin(包括列表页list_editable直接修改价格库存)保存时都会调用save(), 所以都会触发这里的信号
+# note--在事务提交后再清除, 避免提交前有请求读到旧数据重新写入缓存
+@receiver(pre_save, sender=SKU)
+def remember_sku_category(sender, instance, **kwargs):
+    # 修改了分类时, 原分类的列表也要失效
+    instance.old_category_id = None
+    if instance.id is not None:
+        instance.old_category_id = SKU.objects.filter(id=instance.id).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+def clear_sku_card(sender, instance, **kwargs):
+    sku_id = instance.id
+    transaction.on_commit(lambda: delete_sku_cards([sku_id]))
+    # 价格, 上架状态等修改后, 所在分类的商品总数和列表缓存一起失效
+    category_ids = set([instance.category_id, getattr(instance, 'old_category_id', None)]) - set([None])
+    transaction.on_commit(lambda: bump_category_versions(category_ids))
+
+
+@receiver(post_save, sender=SKUImage)
+@receiver(post_delete, sender=SKUImage)
+def clear_sku_image_card(sender, instance, **kwargs):
+    sku_id = instance.sku_id
+    transaction.on_commit(lambda: delete_sku_cards([sku_id]))
+
+
+# tips--分类或频道修改后商品分类菜单的缓存失效
+@receiver(post_save, sender=GoodsCategory)
+@receiver(post_delete, sender=GoodsCategory)
+@receiver(post_save, sender=GoodsChannel)
+@receiver(post_delete, sender=GoodsChannel)
+def clear_categories(sender, instance, **kwargs):
+    transaction.on_commit(bump_categories_version)
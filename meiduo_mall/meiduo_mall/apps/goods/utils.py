@@ -1,44 +1,95 @@
+import json
 from collections import OrderedDict
 
-from .models import GoodsChannel
+from django.db import router
+from django_redis import get_redis_connection
+
+from goods import constants
+from meiduo_mall.utils.local_cache import LRUCache
+from .models import GoodsChannel, GoodsCategory
+
+
+# 商品分类菜单的版本号, 分类或频道修改后由goods.signals递增
+# 菜单按版本号缓存在redis(categories_<版本号>)和进程内, 版本号变化后旧的缓存不再被读取, 等待自然过期
+CATEGORIES_VERSION_KEY = 'categories_version'
+
+local_categories = LRUCache(4, constants.CATEGORIES_LOCAL_CACHE_EXPIRES)
+
+
+def categories_key(version):
+    return 'categories_%s' % version
+
+
+def build_categories():
+    """
+    查询数据库构建商品分类菜单, 频道和所有类别各一条查询
+    note--从主库查询, 避免版本号递增后从库延迟, 把旧的菜单缓存到新的版本号下
+    """
+    db = router.db_for_write(GoodsCategory)
+    channels = GoodsChannel.objects.using(db).order_by('group_id', 'sequence').values_list('group_id', 'category_id', 'url')
+
+    names = {}
+    children = {}
+    for cat_id, name, parent_id in GoodsCategory.objects.using(db).order_by('id').values_list('id', 'name', 'parent_id'):
+        names[cat_id] = name
+        children.setdefault(parent_id, []).append(cat_id)
+
+    categories = OrderedDict()
+    for group_id, cat1_id, url in channels:
+        if group_id not in categories:
+            categories[group_id] = {'channels': [], 'sub_cats': []}
+
+        # 追加当前频道
+        categories[group_id]['channels'].append({
+            'id': cat1_id,
+            'name': names.get(cat1_id),
+            'url': url
+        })
+        # 构建当前类别的子类别
+        for cat2_id in children.get(cat1_id, []):
+            categories[group_id]['sub_cats'].append({
+                'id': cat2_id,
+                'name': names[cat2_id],
+                'sub_cats': [{'id': cat3_id, 'name': names[cat3_id]} for cat3_id in children.get(cat2_id, [])]
+            })
+    return categories
 
 
 def get_categories():
     """
     获取商城商品分类菜单
-    :return 菜单字典
+    :return 菜单字典, 进程内共享, 不要修改
     """
     # 商品频道及分类菜单
     # 使用有序字典保存类别的顺序
     # categories = {
     #     1: { # 组1
     #         'channels': [{'id':, 'name':, 'url':},{}, {}...],
-    #         'sub_cats': [{'id':, 'name':, 'sub_cats':[{},{}]}, {}, {}, ..]
+    #         'sub_cats': [{'id':, 'name':, 'sub_cats':[{'id':, 'name':},{}]}, {}, {}, ..]
     #     },
     #     2: { # 组2
     #
     #     }
     # }
-    categories = OrderedDict()
-    channels = GoodsChannel.objects.order_by('group_id', 'sequence')
-    for channel in channels:
-        group_id = channel.group_id  # 当前组
+    redis_conn = get_redis_connection('goods')
+    version = int(redis_conn.get(CATEGORIES_VERSION_KEY) or 0)
 
-        if group_id not in categories:
-            categories[group_id] = {'channels': [], 'sub_cats': []}
+    categories = local_categories.get(version)
+    if categories is None:
+        value = redis_conn.get(categories_key(version))
+        if value is None:
+            value = json.dumps(build_categories())
+            redis_conn.setex(categories_key(version), constants.CATEGORIES_REDIS_EXPIRES, value)
+        else:
+            value = value.decode()
+        # note--都从json解析, 组号统一为字符串, 与是否命中缓存无关
+        categories = json.loads(value, object_pairs_hook=OrderedDict)
+        local_categories.set(version, categories)
+    return categories
 
-        cat1 = channel.category  # 当前频道的类别
 
-        # 追加当前频道
-        categories[group_id]['channels'].append({
-            'id': cat1.id,
-            'name': cat1.name,
-            'url': channel.url
-        })
-        # 构建当前类别的子类别
-        for cat2 in cat1.goodscategory_set.all():
-            cat2.sub_cats = []
-            for cat3 in cat2.goodscategory_set.all():
-                cat2.sub_cats.append(cat3)
-            categories[group_id]['sub_cats'].append(cat2)
-    return categories
\ No newline at end of file
+def bump_categories_version():
+    """
+    分类或频道修改后使菜单缓存失效
+    """
+    get_redis_connection('goods').incr(CATEGORIES_VERSION_KEY)
@@ -1,10 +1,27 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.db import router
 from django.shortcuts import render
 from drf_haystack.viewsets import HaystackViewSet
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
 
+from goods import constants
+from goods.cache import get_sku_cards, get_category_version
 from goods.models import SKU
+from goods.pagination import SKUListPagination
 from goods.serializers import SKUSerializer, SKUIndexSerializer
+from meiduo_mall.utils.response_cache import cache_response
+
+
+def sku_list_cache_key(view, request, category_id):
+    """
+    商品列表的缓存键: 分类, 分类的版本号, 排序, 分页参数, 域名(下一页链接是完整的地址)
+    """
+    params = [(name, request.query_params.get(name)) for name in ('ordering', 'page', 'page_size', 'cursor')]
+    value = '%s|%s' % (request.get_host(), urlencode(params))
+    return 'sku_list_%s_%s_%s' % (category_id, get_category_version(category_id), hashlib.sha1(value.encode()).hexdigest())
 
 
 # tips--商品列表
@@ -21,6 +38,10 @@ class SKUListView(ListAPIView):
     OrderingFilter过滤器要使用ordering_fields 属性来指明可以进行排序的字段有哪些
     """
     ordering_fields = ('create_time', 'price', 'sales')
+    ordering = ('-create_time',)
+
+    # note--页码分页的总数使用缓存; 带cursor参数时使用游标分页, 每种排序都有 (分类, 上架, 排序字段, id) 索引
+    pagination_class = SKUListPagination
 
     # note--查询的时候要根据不同的三级分类查询数据, 即需要动态的修改查询集
     # note--对于get_queryset函数内部拿到命名参数, 可以使用kwargs, 匿名参数可以使用args
@@ -40,10 +61,16 @@ class SKUListView(ListAPIView):
     self.context['format']  ==> 将视图接收请求数据的格式format封装到了序列化器的context对象中
 
     """
+    # tips--列表只在该分类的商品修改后变化, 按分类的版本号缓存整个响应, 支持ETag/304
+    @cache_response(sku_list_cache_key, constants.SKU_LIST_CACHE_EXPIRES, 'goods')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         # note--获取命名路径参数, 拿到分类
         category_id = self.kwargs['category_id']
-        return SKU.objects.filter(category_id=category_id, is_launched=True)
+        # note--只在缓存未命中时查询, 结果按修改后递增的版本号缓存, 从主库读取, 避免从库延迟时把修改前的列表缓存下来
+        return SKU.objects.using(router.db_for_write(SKU)).filter(category_id=category_id, is_launched=True)
 
 
 # tips--商品搜索
@@ -55,6 +82,13 @@ class SKUSearchViewSet(HaystackViewSet):
 
     serializer_class = SKUIndexSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # 一页搜索结果的商品卡片一次性取出
+        if kwargs.get('many') and args:
+            serializer.context['sku_cards'] = get_sku_cards([result.pk for result in args[0]])
+        return serializer
+
 
 
 
@@ -1,14 +1,33 @@
 import xadmin
 
-from .models import OrderInfo
+from .models import OrderInfo, OrderRollup, FreightRule
 
 
 class OrderInfoAdmin(object):
-     data_charts = {
-        "order_amount": {'title': '订单金额', "x-field": "create_time", "y-field": ('total_amount',),
-                       "order": ('create_time',)},
-        "order_count": {'title': '订单量', "x-field": "create_time", "y-field": ('total_count',),
-                       "order": ('create_time',)},
+    list_display = ['order_id', 'user', 'total_amount', 'pay_method', 'status', 'create_time']
+    list_filter = ['status', 'pay_method']
+
+
+class OrderRollupAdmin(object):
+    """
+    订单统计图表, 读取按小时/天汇总的数据, 查询的行数只与时间范围有关, 与订单量无关
+    note--先在过滤器中选择统计周期, 否则小时和天的数据会画在同一张图中
+    """
+    list_display = ['period', 'bucket', 'order_count', 'total_count', 'total_amount', 'paid_count', 'paid_amount']
+    list_filter = ['period', 'bucket']
+    ordering = ['-bucket']
+    data_charts = {
+        "order_amount": {'title': '订单金额', "x-field": "bucket", "y-field": ('total_amount', 'paid_amount'),
+                         "order": ('bucket',)},
+        "order_count": {'title': '订单量', "x-field": "bucket", "y-field": ('order_count', 'paid_count'),
+                        "order": ('bucket',)},
     }
 
+
+class FreightRuleAdmin(object):
+    list_display = ['area', 'first_weight', 'first_price', 'additional_weight', 'additional_price', 'free_amount']
+
+
 xadmin.site.register(OrderInfo, OrderInfoAdmin)
+xadmin.site.register(OrderRollup, OrderRollupAdmin)
+xadmin.site.register(FreightRule, FreightRuleAdmin)
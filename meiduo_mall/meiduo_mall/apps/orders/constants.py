@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+# 没有配置运费规则时的固定运费
+ORDER_FREIGHT = Decimal('10.00')
+
+# 每个进程检查运费规则版本号的间隔(秒), 规则修改后最多这么久所有进程生效
+FREIGHT_RULES_CHECK_INTERVAL = 5
+
+# 下单时扣减库存的最大尝试次数
+ORDER_STOCK_UPDATE_MAX_TIMES = 4
+
+# 乐观锁连续冲突达到该次数后, 改为select_for_update锁定商品行再扣减
+ORDER_STOCK_LOCK_AFTER_CONFLICTS = 2
+
+# 冲突后重试前的随机等待时间(秒), 第n次冲突后在 [0, min(BACKOFF * 2^n, BACKOFF_MAX)] 中随机
+ORDER_STOCK_RETRY_BACKOFF = 0.01
+ORDER_STOCK_RETRY_BACKOFF_MAX = 0.1
+
+# 记录每个SKU库存冲突次数的redis hash
+ORDER_STOCK_CONFLICTS_KEY = 'order_stock_conflicts'
+
+# 预扣库存订单提交后, 延迟多少秒把扣减数量同步到数据库, 这段时间内的订单合并为一次同步
+RESERVED_STOCK_RECONCILE_DELAY = 1
+
+# 同步预扣库存的锁的有效期(秒)
+RESERVED_STOCK_RECONCILE_LOCK_EXPIRES = 60
+
+# 异步下单排队凭证的有效期(秒), 超时没有被处理的凭证不再计入排队数量
+ORDER_TICKET_EXPIRES = 600
+
+# 异步下单最多排队的凭证数量, 超过后拒绝下单
+ORDER_QUEUE_MAX_SIZE = 2000
+
+# 查询凭证时最长等待下单完成的时间(秒)
+ORDER_TICKET_MAX_WAIT = 10
+
+# 订单编号机器号的租期(秒)
+ORDER_ID_WORKER_LEASE = 60
+
+# 未支付订单自动取消的时间(秒)
+ORDER_UNPAID_EXPIRES = 30 * 60
+
+# 每次取消的订单数量
+ORDER_CANCEL_BATCH = 100
+
+# 取出到期订单后, 如果这段时间(秒)内没有处理完成, 会被重新取出
+ORDER_CANCEL_LEASE = 60
+
+# 取消订单后是否把商品放回用户的购物车
+ORDER_CANCEL_RESTORE_CART = False
@@ -0,0 +1,137 @@
+"""
+未支付订单超时自动取消
+
+    order_expire:  zset { order_id: 取消时间戳 }
+
+下单时加入, 支付后移除, 定时任务每次只取出已到期的一批订单(ZRANGEBYSCORE, O(log n + 批量大小)), 不扫描订单表
+取出时把这批订单的分数改为 当前时间 + ORDER_CANCEL_LEASE, 处理完成后删除;
+处理过程中进程中断的订单, 租期过后会被重新取出
+"""
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django_redis import get_redis_connection
+
+from carts.storage import get_cart_storage
+from goods.models import SKU
+from goods.sales import record_sales
+from meiduo_mall.utils.models import case_by_id
+from orders import constants
+from orders.models import OrderInfo, OrderGoods
+from orders.reservation import release_stocks
+
+
+EXPIRE_KEY = 'order_expire'
+
+# 取出到期的订单 KEYS: order_expire, ARGV: 当前时间, 批量大小, 租期到期时间
+POP_DUE_SCRIPT = """
+local order_ids = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, order_id in ipairs(order_ids) do
+    redis.call('zadd', KEYS[1], ARGV[3], order_id)
+end
+return order_ids
+"""
+
+
+def get_expire_redis():
+    return get_redis_connection('default')
+
+
+def schedule_expire(order_ids, deadline=None, redis_conn=None):
+    """
+    安排订单在deadline时自动取消, 默认为ORDER_UNPAID_EXPIRES秒后
+    """
+    if not order_ids:
+        return
+    redis_conn = redis_conn or get_expire_redis()
+    deadline = deadline or time.time() + constants.ORDER_UNPAID_EXPIRES
+    args = []
+    for order_id in order_ids:
+        args.extend([deadline, order_id])
+    # note--redis-py 2.x和3.x的zadd参数不同, 直接使用命令
+    redis_conn.execute_command('ZADD', EXPIRE_KEY, *args)
+
+
+def unschedule_expire(order_id, redis_conn=None):
+    """
+    订单支付后不再自动取消
+    """
+    redis_conn = redis_conn or get_expire_redis()
+    redis_conn.zrem(EXPIRE_KEY, order_id)
+
+
+def pop_due(limit, redis_conn=None):
+    """
+    取出一批已到期的订单
+    :return: 订单编号列表
+    """
+    redis_conn = redis_conn or get_expire_redis()
+    now = time.time()
+    order_ids = redis_conn.register_script(POP_DUE_SCRIPT)(
+        keys=[EXPIRE_KEY], args=[now, limit, now + constants.ORDER_CANCEL_LEASE])
+    return [order_id.decode() for order_id in order_ids]
+
+
+def cancel_orders(order_ids):
+    """
+    取消仍未支付的订单, 归还库存, 记录负的销量增量
+    已支付或已取消的订单不做处理
+    :return: 取消的订单编号列表
+    """
+    with transaction.atomic():
+        # 锁定订单, 避免同时支付
+        canceled = list(OrderInfo.objects.select_for_update().filter(
+            order_id__in=order_ids, status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']
+        ).values_list('order_id', flat=True))
+
+        if canceled:
+            OrderInfo.objects.filter(order_id__in=canceled).update(status=OrderInfo.ORDER_STATUS_ENUM['CANCELED'])
+
+            lines = list(OrderGoods.objects.filter(order_id__in=canceled).values_list(
+                'order_id', 'sku_id', 'sku__goods', 'count'))
+            sku_counts = defaultdict(int)
+            for _, sku_id, _, count in lines:
+                sku_counts[sku_id] += count
+
+            # 一条语句归还所有商品的库存, 销量记录为负的增量
+            SKU.objects.filter(id__in=sku_counts.keys()).update(stock=F('stock') + case_by_id(sku_counts))
+            record_sales([(sku_id, goods_id, -count) for _, sku_id, goods_id, count in lines])
+
+            transaction.on_commit(lambda: after_cancel(canceled, lines, sku_counts))
+
+    return canceled
+
+
+def after_cancel(canceled, lines, sku_counts):
+    """
+    取消提交之后, 归还redis中预扣的库存, 并按配置把商品放回购物车
+    note--预扣库存的商品数据库库存 = redis库存 + 待同步数量, 两边同时归还后仍然一致
+    """
+    release_stocks(sku_counts)
+
+    if constants.ORDER_CANCEL_RESTORE_CART:
+        users = dict(OrderInfo.objects.filter(order_id__in=canceled).values_list('order_id', 'user_id'))
+        for order_id, sku_id, _, count in lines:
+            get_cart_storage(users[order_id]).add(sku_id, count, False)
+
+
+def cancel_expired_orders(redis_conn=None):
+    """
+    取消所有到期未支付的订单
+    :return: 取消的订单数量
+    """
+    redis_conn = redis_conn or get_expire_redis()
+    total = 0
+    while True:
+        order_ids = pop_due(constants.ORDER_CANCEL_BATCH, redis_conn)
+        if not order_ids:
+            break
+
+        total += len(cancel_orders(order_ids))
+        redis_conn.zrem(EXPIRE_KEY, *order_ids)
+
+        if len(order_ids) < constants.ORDER_CANCEL_BATCH:
+            break
+    return total
@@ -0,0 +1,111 @@
+"""
+运费计算
+
+运费规则(FreightRule)编译成进程内的查找表 { area_id: 规则 }, 计算时按 市 -> 省 -> 默认规则 的顺序查找, 不访问数据库
+    freight_rules_version:  string 规则版本号, 规则修改提交后由orders.signals递增
+各进程每隔FREIGHT_RULES_CHECK_INTERVAL秒读取一次版本号, 版本变化时重新加载规则
+没有配置任何规则时使用固定运费ORDER_FREIGHT
+结算和下单都使用calculate_freight, 保证两边计算的运费一致
+"""
+import math
+import threading
+import time
+from decimal import Decimal
+
+from django.db import router
+from django_redis import get_redis_connection
+
+from orders import constants
+from orders.models import FreightRule
+
+
+FREIGHT_RULES_VERSION_KEY = 'freight_rules_version'
+
+
+class FreightTable(object):
+    """
+    编译后的运费规则
+    """
+    def __init__(self, rules=()):
+        self.rules = dict((rule.area_id, (
+            rule.first_weight, rule.first_price, rule.additional_weight, rule.additional_price, rule.free_amount
+        )) for rule in rules)
+
+    def find_rule(self, province_id, city_id):
+        for area_id in (city_id, province_id):
+            if area_id is not None and area_id in self.rules:
+                return self.rules[area_id]
+        return self.rules.get(None)
+
+    def calculate(self, province_id, city_id, weight, amount):
+        """
+        :param weight: 商品总重量(kg)
+        :param amount: 商品总金额
+        """
+        rule = self.find_rule(province_id, city_id)
+        if rule is None:
+            return constants.ORDER_FREIGHT
+
+        first_weight, first_price, additional_weight, additional_price, free_amount = rule
+        if free_amount is not None and amount >= free_amount:
+            return Decimal('0.00')
+        if weight <= first_weight or not additional_weight:
+            return first_price
+        return first_price + additional_price * math.ceil((weight - first_weight) / additional_weight)
+
+
+class FreightCalculator(object):
+    """
+    持有当前的运费表, 定期检查版本号, 线程安全
+    """
+    def __init__(self):
+        self.table = None
+        self.version = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def get_table(self):
+        if self.table is not None and time.monotonic() < self.checked_at + constants.FREIGHT_RULES_CHECK_INTERVAL:
+            return self.table
+
+        with self.lock:
+            if self.table is None or time.monotonic() >= self.checked_at + constants.FREIGHT_RULES_CHECK_INTERVAL:
+                # note--先读版本号再加载规则, 加载期间规则又被修改时, 下次检查会发现版本变化
+                version = get_redis_connection('default').get(FREIGHT_RULES_VERSION_KEY)
+                if self.table is None or version != self.version:
+                    # 从主库加载, 避免从库延迟读到旧规则
+                    rules = FreightRule.objects.using(router.db_for_write(FreightRule)).all()
+                    self.table = FreightTable(rules)
+                    self.version = version
+                self.checked_at = time.monotonic()
+            return self.table
+
+    def invalidate(self):
+        """
+        本进程内下次计算时重新检查
+        """
+        self.checked_at = 0
+
+
+freight_calculator = FreightCalculator()
+
+
+def calculate_freight(address, lines):
+    """
+    计算订单运费
+    :param address: 收货地址, 只使用province_id和city_id, 为None时使用默认规则
+    :param lines: [(单价, 重量, 数量)], 单价和重量可以是Decimal或字符串(商品卡片)
+    """
+    weight = sum((Decimal(weight or 0) * count for _, weight, count in lines), Decimal(0))
+    amount = sum((Decimal(price) * count for price, _, count in lines), Decimal(0))
+    province_id = address.province_id if address is not None else None
+    city_id = address.city_id if address is not None else None
+    return freight_calculator.get_table().calculate(province_id, city_id, weight, amount)
+
+
+def bump_freight_rules_version():
+    """
+    运费规则修改后通知所有进程重新加载
+    """
+    get_redis_connection('default').incr(FREIGHT_RULES_VERSION_KEY)
+    freight_calculator.invalidate()
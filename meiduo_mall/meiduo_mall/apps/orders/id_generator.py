@@ -0,0 +1,133 @@
+"""
+订单编号生成器, 不需要访问数据库, 生成的编号按时间递增, 不包含用户信息
+
+编号为25位数字:
+    UTC时间到毫秒(17位, 20180903153611123) + 机器号(4位) + 毫秒内序号(4位)
+
+机器号从redis租用, 每个进程一个, 保证不同进程生成的编号不重复:
+    order_id_worker_<机器号>:  string 租用者标识, 过期后机器号可以被其他进程租用
+同一毫秒内序号用完时借用下一毫秒, 系统时间回拨时继续使用上次的时间, 保证同一进程的编号不重复且递增
+"""
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from django_redis import get_redis_connection
+
+from orders import constants
+
+
+# 机器号和序号的位数
+WORKER_DIGITS = 4
+SEQUENCE_DIGITS = 4
+MAX_WORKERS = 10 ** WORKER_DIGITS
+MAX_SEQUENCE = 10 ** SEQUENCE_DIGITS
+
+# 续租机器号, 只有仍然是自己租用时才延长有效期
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class WorkerIdUnavailable(Exception):
+    """
+    没有可以租用的机器号
+    """
+    pass
+
+
+class OrderIdGenerator(object):
+    """
+    订单编号生成器, 线程安全, fork之后子进程会重新租用机器号
+    """
+    def __init__(self, redis_conn=None, lease=constants.ORDER_ID_WORKER_LEASE):
+        self.redis_conn = redis_conn
+        self.lease = lease
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.worker_id = None
+        self.token = None
+        self.renew_at = 0
+        self.last_ms = 0
+        self.sequence = 0
+
+    def get_redis(self):
+        if self.redis_conn is None:
+            self.redis_conn = get_redis_connection('default')
+        return self.redis_conn
+
+    @staticmethod
+    def worker_key(worker_id):
+        return 'order_id_worker_%s' % worker_id
+
+    def acquire_worker_id(self):
+        """
+        从随机位置开始依次尝试租用机器号
+        """
+        redis_conn = self.get_redis()
+        token = '%s:%s:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        start = random.randrange(MAX_WORKERS)
+        for offset in range(MAX_WORKERS):
+            worker_id = (start + offset) % MAX_WORKERS
+            if redis_conn.set(self.worker_key(worker_id), token, nx=True, ex=self.lease):
+                self.worker_id = worker_id
+                self.token = token
+                self.renew_at = time.monotonic() + self.lease / 3
+                return
+        raise WorkerIdUnavailable('没有可以租用的订单机器号')
+
+    def ensure_worker_id(self):
+        """
+        确保持有有效的机器号, 租期过去1/3时续租, 续租失败(已经被其他进程租用)时重新租用
+        """
+        if self.pid != os.getpid():
+            self.reset()
+
+        if self.worker_id is None:
+            self.acquire_worker_id()
+        elif time.monotonic() >= self.renew_at:
+            renewed = self.get_redis().register_script(RENEW_SCRIPT)(
+                keys=[self.worker_key(self.worker_id)], args=[self.token, self.lease])
+            if renewed:
+                self.renew_at = time.monotonic() + self.lease / 3
+            else:
+                self.acquire_worker_id()
+
+    def next_id(self):
+        with self.lock:
+            self.ensure_worker_id()
+
+            now_ms = int(time.time() * 1000)
+            if now_ms > self.last_ms:
+                self.last_ms = now_ms
+                self.sequence = 0
+            else:
+                # 同一毫秒内或时间回拨, 继续使用上次的时间
+                self.sequence += 1
+                if self.sequence >= MAX_SEQUENCE:
+                    self.last_ms += 1
+                    self.sequence = 0
+
+            ms = self.last_ms
+            return '%s%03d%0*d%0*d' % (
+                time.strftime('%Y%m%d%H%M%S', time.gmtime(ms // 1000)), ms % 1000,
+                WORKER_DIGITS, self.worker_id, SEQUENCE_DIGITS, self.sequence)
+
+
+order_id_generator = OrderIdGenerator()
+
+
+def generate_order_id():
+    """
+    生成订单编号
+    """
+    return order_id_generator.next_id()
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """
+    根据订单表重新计算订单统计汇总, 每次计算一天, 上线时执行一次, 之后由下单和支付时累加
+    """
+    help = '重新计算订单统计汇总'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='重新计算最近多少天的数据(包括今天)')
+
+    def handle(self, *args, **options):
+        today = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        total = 0
+        for days in range(options['days'] - 1, -1, -1):
+            start = today - datetime.timedelta(days=days)
+            end = start + datetime.timedelta(days=1)
+            total += rebuild_rollups(start, end)
+
+        self.stdout.write('重新计算完成: %d 天, %d 个订单' % (options['days'], total))
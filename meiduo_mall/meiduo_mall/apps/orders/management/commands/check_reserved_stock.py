@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import reservation
+
+
+class Command(BaseCommand):
+    """
+    检查redis预扣库存与数据库库存是否一致: 数据库库存 = redis可售库存 + 待同步数量
+    note--有进行中的订单时会出现短暂的不一致, 应在没有下单的时候执行, 或者多次执行确认
+    """
+    help = '检查redis预扣库存与数据库库存是否一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sku_ids', nargs='*', type=int, help='商品sku id, 默认检查所有开启预扣的商品')
+
+    def handle(self, *args, **options):
+        mismatches = reservation.check(options['sku_ids'] or None)
+        for sku_id, stock, redis_stock, unsynced in mismatches:
+            self.stdout.write('%8d  数据库: %s  redis: %d  待同步: %d' % (sku_id, stock, redis_stock, unsynced))
+
+        if mismatches:
+            raise CommandError('%d 个商品库存不一致' % len(mismatches))
+        self.stdout.write('库存一致')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from orders import reservation
+
+
+class Command(BaseCommand):
+    """
+    关闭商品的redis预扣库存, 并把待同步的数量写入数据库
+    """
+    help = '关闭商品的redis预扣库存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sku_ids', nargs='*', type=int, help='商品sku id')
+        parser.add_argument('--all', action='store_true', help='关闭所有商品')
+
+    def handle(self, *args, **options):
+        sku_ids = options['sku_ids']
+        if options['all']:
+            sku_ids = [int(sku_id) for sku_id in reservation.get_stock_redis().smembers(reservation.RESERVED_SKUS_KEY)]
+
+        remaining = reservation.drain(sku_ids)
+        for sku_id, stock in remaining.items():
+            self.stdout.write('%8d  剩余可售库存: %d' % (sku_id, stock))
+        self.stdout.write('关闭预扣: %d 个商品' % len(remaining))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from orders import reservation
+
+
+class Command(BaseCommand):
+    """
+    为秒杀商品开启redis预扣库存, 应在秒杀开始前执行
+    """
+    help = '为商品开启redis预扣库存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sku_ids', nargs='+', type=int, help='商品sku id')
+
+    def handle(self, *args, **options):
+        loaded = reservation.preload(options['sku_ids'])
+        skipped = set(options['sku_ids']) - set(loaded)
+
+        self.stdout.write('开启预扣: %s' % (','.join(str(sku_id) for sku_id in loaded) or '无'))
+        if skipped:
+            self.stdout.write('已开启或商品不存在: %s' % ','.join(str(sku_id) for sku_id in sorted(skipped)))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from orders import constants
+from orders.expiry import EXPIRE_KEY, get_expire_redis
+from orders.models import OrderInfo
+
+
+class Command(BaseCommand):
+    """
+    把上线自动取消之前创建的未支付订单加入自动取消队列, 只需要在上线时执行一次
+    取消时间为 下单时间 + ORDER_UNPAID_EXPIRES, 已经超时的订单会在下一次定时任务中取消
+    """
+    help = '把已有的未支付订单加入自动取消队列'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=1000, help='每次写入redis的订单数量')
+
+    def handle(self, *args, **options):
+        redis_conn = get_expire_redis()
+        orders = OrderInfo.objects.filter(status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']).values_list(
+            'order_id', 'create_time')
+
+        count = 0
+        pl = redis_conn.pipeline()
+        for order_id, create_time in orders.iterator():
+            # note--redis-py 2.x和3.x的zadd参数不同, 直接使用命令
+            pl.execute_command('ZADD', EXPIRE_KEY, create_time.timestamp() + constants.ORDER_UNPAID_EXPIRES, order_id)
+            count += 1
+            if count % options['batch'] == 0:
+                pl.execute()
+        pl.execute()
+
+        self.stdout.write('加入自动取消队列: %d 个订单' % count)
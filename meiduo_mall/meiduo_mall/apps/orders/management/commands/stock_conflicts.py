@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from goods.models import SKU
+from orders import constants
+
+
+class Command(BaseCommand):
+    """
+    查看下单扣减库存时乐观锁冲突最多的商品
+    """
+    help = '查看下单库存冲突最多的商品'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='显示的商品数量')
+        parser.add_argument('--reset', action='store_true', help='显示后清空计数')
+
+    def handle(self, *args, **options):
+        redis_conn = get_redis_connection('default')
+        counts = redis_conn.hgetall(constants.ORDER_STOCK_CONFLICTS_KEY)
+        counts = sorted(((int(sku_id), int(count)) for sku_id, count in counts.items()),
+                        key=lambda item: item[1], reverse=True)[:options['top']]
+
+        names = dict(SKU.objects.filter(id__in=[sku_id for sku_id, _ in counts]).values_list('id', 'name'))
+        for sku_id, count in counts:
+            self.stdout.write('%8d  %8d  %s' % (sku_id, count, names.get(sku_id, '')))
+
+        if options['reset']:
+            redis_conn.delete(constants.ORDER_STOCK_CONFLICTS_KEY)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderinfo',
+            index=models.Index(fields=['user', 'create_time'], name='order_user_create_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderinfo',
+            index=models.Index(fields=['user', 'status', 'create_time'], name='order_user_status_time_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_user_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.SmallIntegerField(choices=[(1, '小时'), (2, '天')], verbose_name='统计周期')),
+                ('bucket', models.DateTimeField(verbose_name='统计时间')),
+                ('order_count', models.IntegerField(default=0, verbose_name='订单量')),
+                ('total_count', models.IntegerField(default=0, verbose_name='商品总数')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='订单金额')),
+                ('paid_count', models.IntegerField(default=0, verbose_name='支付订单量')),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='支付金额')),
+            ],
+            options={
+                'verbose_name': '订单统计',
+                'verbose_name_plural': '订单统计',
+                'db_table': 'tb_order_rollup',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderrollup',
+            unique_together=set([('period', 'bucket')]),
+        ),
+    ]
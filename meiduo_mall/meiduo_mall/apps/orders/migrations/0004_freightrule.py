@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0001_initial'),
+        ('orders', '0003_orderrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreightRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('first_weight', models.DecimalField(decimal_places=3, default=1, max_digits=10, verbose_name='首重(kg)')),
+                ('first_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='首重运费')),
+                ('additional_weight', models.DecimalField(decimal_places=3, default=1, max_digits=10, verbose_name='续重单位(kg)')),
+                ('additional_price', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='续重运费')),
+                ('free_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='包邮金额')),
+                ('area', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='freight_rule', to='areas.Area', verbose_name='地区(省或市)')),
+            ],
+            options={
+                'verbose_name': '运费规则',
+                'verbose_name_plural': '运费规则',
+                'db_table': 'tb_freight_rule',
+            },
+        ),
+    ]
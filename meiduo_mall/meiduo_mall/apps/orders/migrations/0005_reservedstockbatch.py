@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_freightrule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservedStockBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('batch', models.CharField(max_length=32, unique=True, verbose_name='批次编号')),
+            ],
+            options={
+                'verbose_name': '预扣库存同步批次',
+                'verbose_name_plural': '预扣库存同步批次',
+                'db_table': 'tb_reserved_stock_batch',
+            },
+        ),
+    ]
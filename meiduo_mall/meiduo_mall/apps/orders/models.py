@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, router
 
 from meiduo_mall.utils.models import BaseModel
 from users.models import User, Address
@@ -24,7 +25,8 @@ class OrderInfo(BaseModel):
         "UNSEND": 2,
         "UNRECEIVED": 3,
         "UNCOMMENT": 4,
-        "FINISHED": 5
+        "FINISHED": 5,
+        "CANCELED": 6
     }
 
     ORDER_STATUS_CHOICES = (
@@ -50,6 +52,11 @@ class OrderInfo(BaseModel):
         db_table = "tb_order_info"
         verbose_name = '订单基本信息'
         verbose_name_plural = verbose_name
+        # tips--用户订单列表按下单时间倒序分页, InnoDB二级索引中包含主键order_id, 游标条件和排序都可以只用索引完成
+        indexes = [
+            models.Index(fields=['user', 'create_time'], name='order_user_create_time_idx'),
+            models.Index(fields=['user', 'status', 'create_time'], name='order_user_status_time_idx'),
+        ]
 
 
 class OrderGoods(BaseModel):
@@ -77,3 +84,78 @@ class OrderGoods(BaseModel):
         db_table = "tb_order_goods"
         verbose_name = '订单商品'
         verbose_name_plural = verbose_name
+
+
+class OrderRollup(models.Model):
+    """
+    按小时/天汇总的订单统计, 下单和支付时累加, 后台图表只需要读取汇总的数据
+    """
+    PERIOD_ENUM = {
+        "HOUR": 1,
+        "DAY": 2
+    }
+
+    PERIOD_CHOICES = (
+        (1, "小时"),
+        (2, "天"),
+    )
+
+    period = models.SmallIntegerField(choices=PERIOD_CHOICES, verbose_name="统计周期")
+    bucket = models.DateTimeField(verbose_name="统计时间")
+    order_count = models.IntegerField(default=0, verbose_name="订单量")
+    total_count = models.IntegerField(default=0, verbose_name="商品总数")
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="订单金额")
+    paid_count = models.IntegerField(default=0, verbose_name="支付订单量")
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="支付金额")
+
+    class Meta:
+        db_table = "tb_order_rollup"
+        verbose_name = '订单统计'
+        verbose_name_plural = verbose_name
+        unique_together = ('period', 'bucket')
+
+
+class FreightRule(BaseModel):
+    """
+    运费规则, 按收货地址的 市 -> 省 -> 默认规则(不设置地区) 的顺序匹配
+    运费 = 首重运费 + ceil((总重量 - 首重) / 续重单位) * 续重运费, 订单金额达到包邮金额时免运费
+    """
+    area = models.OneToOneField('areas.Area', null=True, blank=True, on_delete=models.CASCADE, related_name='freight_rule', verbose_name='地区(省或市)')
+    first_weight = models.DecimalField(max_digits=10, decimal_places=3, default=1, verbose_name='首重(kg)')
+    first_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='首重运费')
+    additional_weight = models.DecimalField(max_digits=10, decimal_places=3, default=1, verbose_name='续重单位(kg)')
+    additional_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='续重运费')
+    free_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='包邮金额')
+
+    class Meta:
+        db_table = 'tb_freight_rule'
+        verbose_name = '运费规则'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return '%s运费' % (self.area or '默认')
+
+    def clean(self):
+        """
+        后台保存时校验: 默认规则只能有一条, 地区只能是省或市
+        note--运费只按收货地址的市和省匹配, 区县的规则永远不会被使用
+        note--area可以为NULL, 数据库的唯一约束不限制默认规则的数量
+        """
+        if self.area_id is None:
+            rules = FreightRule.objects.using(router.db_for_write(FreightRule))
+            if rules.filter(area__isnull=True).exclude(pk=self.pk).exists():
+                raise ValidationError({'area': '默认运费规则已存在'})
+        elif self.area.parent_id is not None and self.area.parent.parent_id is not None:
+            raise ValidationError({'area': '只能为省或市设置运费规则'})
+
+
+class ReservedStockBatch(BaseModel):
+    """
+    已经合并到库存的预扣库存批次, 防止同一批数据重复扣减库存
+    """
+    batch = models.CharField(max_length=32, unique=True, verbose_name='批次编号')
+
+    class Meta:
+        db_table = 'tb_reserved_stock_batch'
+        verbose_name = '预扣库存同步批次'
+        verbose_name_plural = verbose_name
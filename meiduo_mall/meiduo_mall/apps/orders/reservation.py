@@ -0,0 +1,240 @@
+"""
+秒杀商品的redis预扣库存
+
+开启预扣的SKU在redis中保存可售库存, 下单时用lua脚本原子地检查并扣减, 不再在下单事务中更新tb_sku的库存行:
+    reserved_stock_skus:        set  { sku_id, ... } 开启预扣的商品
+    reserved_stock_<sku_id>:    string 可售库存
+订单提交后扣减的数量累加到待同步的hash中, 由celery任务异步合并到tb_sku的库存:
+    reserved_stock_pending:     hash { sku_id: 待同步数量 }
+    reserved_stock_processing:  hash 正在同步的数据, 同步中断后下次先处理这里的数据
+                                     其中_batch字段为这批数据的编号, 与库存更新在同一事务中记录到tb_reserved_stock_batch
+
+没有进行中的订单时应满足: tb_sku.stock = redis可售库存 + 待同步数量, check_reserved_stock命令检查这一点
+note--开启预扣期间不要在后台修改这些商品的库存, 先drain再修改
+"""
+import uuid
+
+import redis
+from django.db import transaction, router
+from django.db.models import F
+from django_redis import get_redis_connection
+
+from goods.models import SKU
+from meiduo_mall.utils.exceptions import logger
+from meiduo_mall.utils.models import case_by_id
+from orders import constants
+from orders.models import ReservedStockBatch
+
+
+RESERVED_SKUS_KEY = 'reserved_stock_skus'
+PENDING_KEY = 'reserved_stock_pending'
+PROCESSING_KEY = 'reserved_stock_processing'
+RECONCILE_SCHEDULED_KEY = 'reserved_stock_reconcile_scheduled'
+RECONCILE_LOCK_KEY = 'reserved_stock_reconcile_lock'
+BATCH_FIELD = '_batch'
+
+# 检查并扣减库存 KEYS: 每个商品的库存键, ARGV: 对应的购买数量
+# 只处理存在库存键(开启了预扣)的商品, 全部足够时才扣减, 返回扣减了的商品序号; 有商品库存不足时返回 {-序号}
+RESERVE_SCRIPT = """
+local reserved = {}
+for i = 1, #KEYS do
+    local stock = redis.call('get', KEYS[i])
+    if stock then
+        if tonumber(stock) < tonumber(ARGV[i]) then
+            return {-i}
+        end
+        reserved[#reserved + 1] = i
+    end
+end
+for _, i in ipairs(reserved) do
+    redis.call('decrby', KEYS[i], ARGV[i])
+end
+return reserved
+"""
+
+# 归还库存, 已经drain的商品不再归还, 避免重新创建库存键
+RELEASE_SCRIPT = """
+for i = 1, #KEYS do
+    if redis.call('exists', KEYS[i]) == 1 then
+        redis.call('incrby', KEYS[i], ARGV[i])
+    end
+end
+"""
+
+
+class InsufficientStock(Exception):
+    """
+    预扣库存不足
+    """
+    def __init__(self, sku_id):
+        super().__init__(sku_id)
+        self.sku_id = sku_id
+
+
+def get_stock_redis():
+    return get_redis_connection('stock')
+
+
+def stock_key(sku_id):
+    return 'reserved_stock_%s' % sku_id
+
+
+def reserve_stocks(cart, redis_conn=None):
+    """
+    在redis中扣减购物车中开启了预扣的商品库存
+    :param cart: { sku_id: count }
+    :return: 扣减了库存的商品 { sku_id: count }
+    :raise InsufficientStock: 开启了预扣的商品库存不足, 此时没有扣减任何商品
+    """
+    redis_conn = redis_conn or get_stock_redis()
+    sku_ids = list(cart.keys())
+    result = redis_conn.register_script(RESERVE_SCRIPT)(
+        keys=[stock_key(sku_id) for sku_id in sku_ids],
+        args=[cart[sku_id] for sku_id in sku_ids]
+    )
+    if result and result[0] < 0:
+        raise InsufficientStock(sku_ids[-result[0] - 1])
+    return dict((sku_ids[i - 1], cart[sku_ids[i - 1]]) for i in result)
+
+
+def release_stocks(reserved, redis_conn=None):
+    """
+    下单失败时归还预扣的库存
+    """
+    if not reserved:
+        return
+    redis_conn = redis_conn or get_stock_redis()
+    sku_ids = list(reserved.keys())
+    redis_conn.register_script(RELEASE_SCRIPT)(
+        keys=[stock_key(sku_id) for sku_id in sku_ids],
+        args=[reserved[sku_id] for sku_id in sku_ids]
+    )
+
+
+def commit_stocks(reserved, redis_conn=None):
+    """
+    订单提交后记录待同步到tb_sku的数量, 并安排同步任务
+    同一时间最多只安排一个同步任务, 多个订单的数量在一次同步中合并写入
+    """
+    if not reserved:
+        return
+    redis_conn = redis_conn or get_stock_redis()
+    pl = redis_conn.pipeline()
+    for sku_id, count in reserved.items():
+        pl.hincrby(PENDING_KEY, sku_id, count)
+    pl.set(RECONCILE_SCHEDULED_KEY, 1, nx=True, ex=constants.RESERVED_STOCK_RECONCILE_DELAY)
+    scheduled = pl.execute()[-1]
+
+    if scheduled:
+        from celery_tasks.stock import reconcile_reserved_stock
+        reconcile_reserved_stock.apply_async(countdown=constants.RESERVED_STOCK_RECONCILE_DELAY)
+
+
+def reconcile(redis_conn=None):
+    """
+    将待同步的数量合并到tb_sku的库存, 一条UPDATE语句完成所有商品
+    先把pending改名为processing再处理, 处理期间新的订单写入新的pending, 不会丢失
+    :return: 同步的数据 { sku_id: count }, 其他进程正在同步时返回None
+    """
+    redis_conn = redis_conn or get_stock_redis()
+    if not redis_conn.set(RECONCILE_LOCK_KEY, 1, nx=True, ex=constants.RESERVED_STOCK_RECONCILE_LOCK_EXPIRES):
+        return None
+
+    try:
+        # 上次同步中断时processing还在, 先处理上次的数据
+        if not redis_conn.exists(PROCESSING_KEY):
+            try:
+                redis_conn.rename(PENDING_KEY, PROCESSING_KEY)
+            except redis.ResponseError:
+                # pending不存在, 没有需要同步的数据
+                return {}
+
+        # 给这批数据编号, 改名之后编号之前中断时, 下次补上编号
+        redis_conn.hsetnx(PROCESSING_KEY, BATCH_FIELD, uuid.uuid4().hex)
+        processing = redis_conn.hgetall(PROCESSING_KEY)
+        batch = processing.pop(BATCH_FIELD.encode()).decode()
+        counts = dict((int(sku_id), int(count)) for sku_id, count in processing.items())
+        counts = dict((sku_id, count) for sku_id, count in counts.items() if count)
+        if counts:
+            # note--编号和库存在同一事务中写入, 提交之后删除processing之前中断时, 下次发现编号已存在, 不会重复扣减
+            with transaction.atomic():
+                _, created = ReservedStockBatch.objects.get_or_create(batch=batch)
+                if created:
+                    SKU.objects.filter(id__in=counts.keys()).update(stock=F('stock') - case_by_id(counts))
+                else:
+                    logger.warning('预扣库存批次%s已经同步过, 跳过' % batch)
+
+        redis_conn.delete(PROCESSING_KEY)
+        return counts
+    finally:
+        redis_conn.delete(RECONCILE_LOCK_KEY)
+
+
+def preload(sku_ids, redis_conn=None):
+    """
+    为商品开启预扣, 使用数据库中的库存作为redis中的可售库存, 已经开启的商品不受影响
+    note--应在秒杀开始前执行, 执行期间通过数据库下单的订单不会反映到redis中
+    :return: 新开启预扣的sku_id列表
+    """
+    redis_conn = redis_conn or get_stock_redis()
+    stocks = SKU.objects.using(router.db_for_write(SKU)).filter(id__in=sku_ids).values_list('id', 'stock')
+
+    loaded = []
+    for sku_id, stock in stocks:
+        if redis_conn.set(stock_key(sku_id), stock, nx=True):
+            redis_conn.sadd(RESERVED_SKUS_KEY, sku_id)
+            loaded.append(sku_id)
+    return loaded
+
+
+def drain(sku_ids, redis_conn=None):
+    """
+    关闭商品的预扣, 之后的订单重新在下单事务中扣减数据库库存, 然后同步已有的待同步数量
+    :return: 关闭时redis中剩余的可售库存 { sku_id: stock }
+    """
+    redis_conn = redis_conn or get_stock_redis()
+    pl = redis_conn.pipeline()
+    for sku_id in sku_ids:
+        pl.get(stock_key(sku_id))
+        pl.delete(stock_key(sku_id))
+        pl.srem(RESERVED_SKUS_KEY, sku_id)
+    result = pl.execute()
+
+    remaining = {}
+    for index, sku_id in enumerate(sku_ids):
+        stock = result[index * 3]
+        if stock is not None:
+            remaining[sku_id] = int(stock)
+
+    if reconcile(redis_conn) is None:
+        logger.warning('drain预扣库存时同步任务正在执行, 剩余数据由同步任务处理')
+    return remaining
+
+
+def check(sku_ids=None, redis_conn=None):
+    """
+    比较redis中的库存和数据库中的库存
+    :param sku_ids: 要检查的商品, 默认检查所有开启预扣的商品
+    :return: [(sku_id, 数据库库存, redis可售库存, 待同步数量)], 只包含不一致的商品
+    """
+    redis_conn = redis_conn or get_stock_redis()
+    if sku_ids is None:
+        sku_ids = [int(sku_id) for sku_id in redis_conn.smembers(RESERVED_SKUS_KEY)]
+    if not sku_ids:
+        return []
+
+    pl = redis_conn.pipeline()
+    pl.mget([stock_key(sku_id) for sku_id in sku_ids])
+    pl.hmget(PENDING_KEY, sku_ids)
+    pl.hmget(PROCESSING_KEY, sku_ids)
+    reserved, pending, processing = pl.execute()
+
+    stocks = dict(SKU.objects.using(router.db_for_write(SKU)).filter(id__in=sku_ids).values_list('id', 'stock'))
+
+    mismatches = []
+    for index, sku_id in enumerate(sku_ids):
+        redis_stock = int(reserved[index] or 0)
+        unsynced = int(pending[index] or 0) + int(processing[index] or 0)
+        if stocks.get(sku_id) != redis_stock + unsynced:
+            mismatches.append((sku_id, stocks.get(sku_id), redis_stock, unsynced))
+    return mismatches
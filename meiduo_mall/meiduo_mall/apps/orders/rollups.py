@@ -0,0 +1,93 @@
+"""
+订单统计汇总
+
+每个订单按下单时间(本地时区)计入所在小时和所在天的汇总行, 支付后再累加支付数据
+下单/支付提交之后各执行两条UPDATE, 不在订单事务中, 不会延长订单事务持有的锁
+"""
+from collections import defaultdict
+
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from orders.models import OrderInfo, OrderRollup
+
+
+# 已经支付的支付宝订单状态
+PAID_STATUSES = (
+    OrderInfo.ORDER_STATUS_ENUM['UNSEND'],
+    OrderInfo.ORDER_STATUS_ENUM['UNRECEIVED'],
+    OrderInfo.ORDER_STATUS_ENUM['UNCOMMENT'],
+    OrderInfo.ORDER_STATUS_ENUM['FINISHED'],
+)
+
+ROLLUP_FIELDS = ('order_count', 'total_count', 'total_amount', 'paid_count', 'paid_amount')
+
+
+def get_buckets(create_time):
+    """
+    :return: { 统计周期: 统计时间 }
+    """
+    local_time = timezone.localtime(create_time)
+    hour = local_time.replace(minute=0, second=0, microsecond=0)
+    return {
+        OrderRollup.PERIOD_ENUM['HOUR']: hour,
+        OrderRollup.PERIOD_ENUM['DAY']: hour.replace(hour=0),
+    }
+
+
+def add_to_rollup(period, bucket, **values):
+    """
+    累加到汇总行, 汇总行不存在时创建
+    """
+    updates = dict((field, F(field) + value) for field, value in values.items())
+    if OrderRollup.objects.filter(period=period, bucket=bucket).update(**updates):
+        return
+
+    try:
+        with transaction.atomic():
+            OrderRollup.objects.create(period=period, bucket=bucket, **values)
+    except IntegrityError:
+        # 其他进程同时创建了该汇总行
+        OrderRollup.objects.filter(period=period, bucket=bucket).update(**updates)
+
+
+def record_order_created(order):
+    for period, bucket in get_buckets(order.create_time).items():
+        add_to_rollup(period, bucket, order_count=1, total_count=order.total_count, total_amount=order.total_amount)
+
+
+def record_order_paid(order):
+    for period, bucket in get_buckets(order.create_time).items():
+        add_to_rollup(period, bucket, paid_count=1, paid_amount=order.total_amount)
+
+
+def rebuild_rollups(start, end):
+    """
+    根据订单表重新计算[start, end)内的汇总数据, start和end应该是本地时间的整天
+    note--计算期间新下的订单会被覆盖掉, 应在订单较少的时候执行, 或者只计算之前的日期
+    :return: 计算的订单数量
+    """
+    rollups = defaultdict(lambda: dict((field, 0) for field in ROLLUP_FIELDS))
+    orders = OrderInfo.objects.filter(create_time__gte=start, create_time__lt=end).values_list(
+        'create_time', 'total_count', 'total_amount', 'pay_method', 'status')
+
+    count = 0
+    for create_time, total_count, total_amount, pay_method, status in orders.iterator():
+        paid = pay_method == OrderInfo.PAY_METHODS_ENUM['ALIPAY'] and status in PAID_STATUSES
+        for key in get_buckets(create_time).items():
+            rollup = rollups[key]
+            rollup['order_count'] += 1
+            rollup['total_count'] += total_count
+            rollup['total_amount'] += total_amount
+            if paid:
+                rollup['paid_count'] += 1
+                rollup['paid_amount'] += total_amount
+        count += 1
+
+    with transaction.atomic():
+        OrderRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        OrderRollup.objects.bulk_create([
+            OrderRollup(period=period, bucket=bucket, **values) for (period, bucket), values in rollups.items()
+        ], batch_size=500)
+    return count
@@ -1,14 +1,21 @@
 import redis
-from decimal import Decimal
 from django.db import transaction
-from django.utils import timezone
-from django_redis import get_redis_connection
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from carts.storage import get_cart_storage
 from goods.models import SKU
+from goods.sales import record_sales
 from meiduo_mall.utils.exceptions import logger
+from orders import constants
+from orders.expiry import schedule_expire
+from orders.freight import calculate_freight
+from orders.id_generator import generate_order_id
 from orders.models import OrderInfo, OrderGoods
+from orders.reservation import reserve_stocks, release_stocks, commit_stocks, InsufficientStock
+from orders.rollups import record_order_created
+from orders.utils import deduct_stocks, find_stock_conflicts, record_stock_conflicts, wait_before_retry
+from users.serializers import UserDetailSerializer, UserAddressSerializer
 
 
 class CartSKUSerializer(serializers.ModelSerializer):
@@ -32,6 +39,55 @@ class OrderSettlementSerializer(serializers.Serializer):
     skus = CartSKUSerializer(many=True)
 
 
+class CheckoutAddressSerializer(UserAddressSerializer):
+    """
+    结算页面的收货地址, 附带寄往该地址的运费
+    """
+    freight = serializers.DecimalField(label='运费', max_digits=10, decimal_places=2, read_only=True)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """
+    结算页面初始化数据序列化器
+    """
+    user = UserDetailSerializer()
+    default_address_id = serializers.IntegerField(label='默认地址', allow_null=True)
+    addresses = CheckoutAddressSerializer(many=True)
+    freight = serializers.DecimalField(label='运费', max_digits=10, decimal_places=2)
+    skus = CartSKUSerializer(many=True)
+
+
+class OrderSKUSerializer(serializers.ModelSerializer):
+    """
+    订单商品的SKU数据序列化器
+    """
+    class Meta:
+        model = SKU
+        fields = ('id', 'name', 'default_image_url')
+
+
+class OrderGoodsSerializer(serializers.ModelSerializer):
+    """
+    订单商品数据序列化器
+    """
+    sku = OrderSKUSerializer()
+
+    class Meta:
+        model = OrderGoods
+        fields = ('sku', 'count', 'price')
+
+
+class OrderListSerializer(serializers.ModelSerializer):
+    """
+    用户订单列表序列化器
+    """
+    skus = OrderGoodsSerializer(many=True)
+
+    class Meta:
+        model = OrderInfo
+        fields = ('order_id', 'create_time', 'total_count', 'total_amount', 'freight', 'pay_method', 'status', 'skus')
+
+
 class SaveOrderSerializer(serializers.ModelSerializer):
     """
     下单数据序列化器
@@ -53,23 +109,80 @@ class SaveOrderSerializer(serializers.ModelSerializer):
             }
         }
 
-    # note--涉及到对多个数据库的操作, 需要开启事务!
     def create(self, validated_data):
         """
         保存订单
         """
         # 获取当前下单用户
         # note--注意context是python标准字典, 但是request对象不是, 所以使用request.user
-        user = self.context['request'].user
+        # note--异步下单的worker中没有request, 直接在context中传入user
+        user = self.context['user'] if 'user' in self.context else self.context['request'].user
 
         # 获取地址支付信息
         pay_method = validated_data['pay_method']
         address = validated_data['address']
 
-        # 组织订单编号 20170903153611+user.id
-        # timezone.now() -> datetime
-        order_id = timezone.now().strftime('%Y%m%d%H%M%S') + ('%09d' % user.id)
+        # 组织订单编号 20170903153611123+机器号+序号
+        # note--原来的 时间+user.id 同一用户一秒内下两单会主键冲突, 并且暴露了用户id
+        order_id = generate_order_id()
+
+        # 获取购物车信息
+        # tips--构建勾选商品数据结构
+        # 构建一个　{ select_sku_id: count }　数据格式
+        cart_storage = get_cart_storage(user.id)
+        cart = cart_storage.get_selected()
+        if not cart:
+            raise serializers.ValidationError('没有勾选要购买的商品')
+
+        # 秒杀商品先在redis中扣减库存, 这些商品不再在下单事务中更新数据库库存
+        try:
+            reserved = reserve_stocks(cart)
+        except InsufficientStock:
+            raise serializers.ValidationError('商品库存不足')
+
+        try:
+            # tips--乐观锁冲突时整个事务回滚, 随机等待后在新的事务中重试, 等待期间不持有任何行锁
+            # tips--连续冲突达到ORDER_STOCK_LOCK_AFTER_CONFLICTS次后改为加锁查询, 加锁后扣减一定成功
+            order = None
+            for attempt in range(constants.ORDER_STOCK_UPDATE_MAX_TIMES):
+                if attempt > 0:
+                    wait_before_retry(attempt)
+                lock = attempt >= constants.ORDER_STOCK_LOCK_AFTER_CONFLICTS
+                order = self.save_order(order_id, user, address, pay_method, cart, reserved, lock)
+                if order is not None:
+                    break
+
+            if order is None:
+                logger.warning('下单扣减库存冲突%s次, 放弃下单 user: %s' % (constants.ORDER_STOCK_UPDATE_MAX_TIMES, user.id))
+                raise serializers.ValidationError('下单人数过多, 请稍后重试')
+        except Exception:
+            # 下单失败, 归还redis中预扣的库存
+            release_stocks(reserved)
+            raise
+
+        # 订单提交后再记录需要同步到数据库的预扣库存
+        transaction.on_commit(lambda: commit_stocks(reserved))
+
+        # 累加订单统计
+        transaction.on_commit(lambda: record_order_created(order))
+
+        # 未支付的订单到期自动取消
+        if order.status == OrderInfo.ORDER_STATUS_ENUM['UNPAID']:
+            transaction.on_commit(lambda: schedule_expire([order.order_id]))
+
+        # 更新redis中购物车的数据(如果事务未完成则也不删除redis)
+        cart_storage.remove(cart.keys())
+
+        return order
 
+    # note--涉及到对多个数据库的操作, 需要开启事务!
+    def save_order(self, order_id, user, address, pay_method, cart, reserved, lock=False):
+        """
+        在一个事务中扣减库存并保存订单
+        :param reserved: 已经在redis中扣减了库存的商品, 不再检查和扣减数据库库存
+        :param lock: 是否使用select_for_update锁定商品行
+        :return: 订单对象, 库存被其他订单修改过(乐观锁冲突)时返回None
+        """
 
         """
         Django提供了数据库操作的事务机制, 使用方法：
@@ -89,109 +202,70 @@ class SaveOrderSerializer(serializers.ModelSerializer):
         3. 提交从保存点到当前状态的所有数据库事务操作
         transaction.savepoint_commit(save_id)
         """
-        # 生成订单(如果事务未完成则也不删除redis)
+        # 生成订单
+        # note--整个订单固定为 查询SKU + 扣减库存 + 插入销量增量 + 保存订单 + 批量保存订单商品 5条语句, 与商品条数无关
         with transaction.atomic():
             # note--创建一个保存点()
             save_id = transaction.savepoint()
 
             try:
+                # 一次查询出所有购买的商品数据
+                if not lock:
+                    skus = list(SKU.objects.filter(id__in=cart.keys()))
+                else:
+                    # 只锁定需要扣减数据库库存的商品, 按id顺序锁定, 避免不同订单互相等待造成死锁
+                    stock_sku_ids = [sku_id for sku_id in cart.keys() if sku_id not in reserved]
+                    skus = list(SKU.objects.filter(id__in=stock_sku_ids).select_for_update().order_by('id'))
+                    if reserved:
+                        skus += list(SKU.objects.filter(id__in=reserved.keys()))
+                if len(skus) != len(cart):
+                    transaction.savepoint_rollback(save_id)
+                    raise serializers.ValidationError('商品不存在')
+
+                # 判断库存
+                stock_skus = [sku for sku in skus if sku.id not in reserved]
+                for sku in stock_skus:
+                    if cart[sku.id] > sku.stock:
+                        transaction.savepoint_rollback(save_id)
+                        raise serializers.ValidationError('商品库存不足')
+
+                # tips--一条语句根据原始库存条件更新所有SKU, 乐观锁
+                # tips--只要有一个SKU的库存被其他订单修改过, 就记录冲突的SKU并回滚, 由create重试
+                if stock_skus and not deduct_stocks(stock_skus, cart):
+                    conflicts = find_stock_conflicts(stock_skus, cart)
+                    transaction.savepoint_rollback(save_id)
+                    record_stock_conflicts(conflicts)
+                    return None
+
+                # 累计商品的SKU和SPU销量信息, 只插入增量, 不更新商品SPU的行
+                record_sales([(sku.id, sku.goods_id, cart[sku.id]) for sku in skus])
+
+                # 累计订单基本信息的数据
+                total_count = sum(cart.values())
+                total_amount = sum(sku.price * cart[sku.id] for sku in skus)
+                # 与结算页面使用同一个运费表计算, 不查询数据库
+                freight = calculate_freight(address, [(sku.price, sku.weight, cart[sku.id]) for sku in skus])
+
                 order = OrderInfo.objects.create(
                     order_id=order_id,
                     user=user,
                     address=address,
-                    total_count=0,
-                    total_amount=Decimal(0),
-                    freight=Decimal(10),
+                    total_count=total_count,
+                    total_amount=total_amount + freight,
+                    freight=freight,
                     pay_method=pay_method,
                     status=OrderInfo.ORDER_STATUS_ENUM['UNSEND'] if pay_method == OrderInfo.PAY_METHODS_ENUM['CASH'] else OrderInfo.ORDER_STATUS_ENUM['UNPAID']
                 )
 
-                # 获取购物车信息
-                redis_conn = get_redis_connection("cart")   # type: redis.StrictRedis
-                redis_cart = redis_conn.hgetall("cart_%s" % user.id)
-                cart_selected = redis_conn.smembers('cart_selected_%s' % user.id)
-
-                # tips--构建勾选商品数据结构
-                # 查询所有的商品, 构建　{ sku_id: count } 数据格式
-                # cart = {}
-                # for sku_id, count in redis_cart.items():
-                #     cart[int(sku_id)] = int(redis_cart[sku_id])
-
-                # 查询所有的勾选产品的状态
-                # selected = []
-                # for i in cart_selected:
-                #     selected.append(int(i))
-
-                # note-- 构建勾选商品数据结构:这种方法更高效
-                # 构建一个　{ select_sku_id: count }　数据格式, 将bytes类型转换为int类型
-                cart = {}
-                for sku_id in cart_selected:
-                    cart[int(sku_id)] = int(redis_cart[sku_id])
-
-                # 查询出所有购买的商品数据
-                # skus = SKU.objects.filter(id__in=cart.keys())
-
-                # 处理订单商品
-                sku_id_list = cart.keys()
-                # for sku in skus:
-                for sku_id in sku_id_list:
-                    while True:
-                        sku_count = cart[sku_id]
-                        sku = SKU.objects.get(id=sku_id)
-
-                        # 判断库存
-                        origin_stock = sku.stock  # 原始库存
-                        origin_sales = sku.sales  # 原始销量
-
-                        if sku_count > origin_stock:
-                            transaction.savepoint_rollback(save_id)
-                            raise serializers.ValidationError('商品库存不足')
-
-                        # 用于演示并发下单
-                        # import time
-                        # time.sleep(5)
-
-                        # 减少库存, 然后再更新
-                        new_stock = origin_stock - sku_count
-                        new_sales = origin_sales + sku_count
-
-                        # sku.stock = new_stock
-                        # sku.sales = new_sales
-
-                        # note--在一句内完成数据的更新, 避免出现数据的变动
-
-                        # tips--根据原始库存条件更新, 返回更新的条目数, 乐观锁
-                        # tips--返回受影响的行数(如果更新时候的stock是原始的stock才会进行更新, 否则循环执行)
-                        # 更新的时候判断此时的库存是否是之前查询出的库存
-                        ret = SKU.objects.filter(id=sku.id, stock=origin_stock).update(stock=new_stock, sales=new_sales)
-                        if ret == 0:
-                            continue
-
-                        # 只有乐观锁更新成功才继续执行
-                        sku.save()
-
-                        # 累计商品的SPU 销量信息, 这里不需要使用乐观锁进行锁定
-                        sku.goods.sales += sku_count
-                        sku.goods.save()
-
-                        # 累计订单基本信息的数据, 每循环一个产品则累加一次
-                        order.total_count += sku_count                  # 累计商品数
-                        order.total_amount += (sku.price * sku_count)   # 累计总金额
-
-                        # 保存订单商品
-                        OrderGoods.objects.create(
-                            order=order,
-                            sku=sku,
-                            count=sku_count,
-                            price=sku.price,
-                        )
-
-                        # 更新成功
-                        break
-
-                    # 更新订单的金额数量信息
-                    order.total_amount += order.freight
-                    order.save()
+                # 保存订单商品
+                OrderGoods.objects.bulk_create([
+                    OrderGoods(
+                        order=order,
+                        sku=sku,
+                        count=cart[sku.id],
+                        price=sku.price,
+                    ) for sku in skus
+                ])
 
             except ValidationError:
                 # tips--对于库存不足的错误, 直接往外抛出
@@ -211,12 +285,6 @@ class SaveOrderSerializer(serializers.ModelSerializer):
             # 提交事务
             transaction.savepoint_commit(save_id)
 
-            # 更新redis中购物车的数据
-            pl = redis_conn.pipeline()
-            pl.hdel('cart_%s' % user.id, *cart_selected)
-            pl.srem('cart_selected_%s' % user.id, *cart_selected)
-            pl.execute()
-
             """
             MySQL数据库事务隔离级别主要有四种：
 
@@ -226,9 +294,7 @@ class SaveOrderSerializer(serializers.ModelSerializer):
             Read uncommitted 读取为提交，其他事务只要修改了数据，即使未提交，本事务也能看到修改后的数据值
 
             默认为Repeatable read, 如果要使用乐观锁, 需要改为读取已提交, 即其他事物修改之后本事务里面能看到
+            note--这里每次重试都开启新的事务, 重新查询时能看到其他订单已提交的库存, 不依赖隔离级别
 
             """
             return order
-
-
-
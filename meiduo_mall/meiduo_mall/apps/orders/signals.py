@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from orders.freight import bump_freight_rules_version
+from orders.models import FreightRule
+
+
+# tips--运费规则修改后通知各进程重新加载运费表
+# note--在事务提交后再递增版本号, 避免其他进程在提交前重新加载到旧规则
+@receiver(post_save, sender=FreightRule)
+@receiver(post_delete, sender=FreightRule)
+def reload_freight_rules(sender, instance, **kwargs):
+    transaction.on_commit(bump_freight_rules_version)
@@ -1,3 +1,70 @@
-from django.test import TestCase
+from contextlib import ExitStack
 
-# Create your tests here.
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from areas.models import Area
+from carts.storage import get_cart_storage
+from goods.cache import delete_sku_cards
+from goods.models import GoodsCategory, Brand, Goods, SKU
+from orders.freight import freight_calculator
+from users.models import User, Address
+
+
+# 测试数据库只有default, 读写都发到default
+@override_settings(DATABASE_ROUTERS=[])
+class CheckoutViewQueryTest(TestCase):
+    """
+    结算页面初始化接口的SQL语句数
+    note--force_authenticate不查询用户, 实际请求中JWT认证还要多一条查询用户的语句
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('checkout_test', password='password', mobile='13800000000')
+        province = Area.objects.create(name='省')
+        city = Area.objects.create(name='市', parent=province)
+        district = Area.objects.create(name='区', parent=city)
+        address = Address.objects.create(user=self.user, title='家', receiver='张三', province=province, city=city,
+                                         district=district, place='地址', mobile='13800000000')
+        self.user.default_address = address
+        self.user.save()
+
+        category = GoodsCategory.objects.create(name='分类')
+        brand = Brand.objects.create(name='品牌', logo='logo.png', first_letter='P')
+        goods = Goods.objects.create(name='商品', brand=brand, category1=category, category2=category,
+                                     category3=category)
+        self.sku = SKU.objects.create(name='SKU', caption='', goods=goods, category=category, price=10,
+                                      cost_price=5, market_price=12, stock=10)
+
+        self.cart_storage = get_cart_storage(self.user.id)
+        self.cart_storage.update(self.sku.id, 2, True)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        self.cart_storage.remove([self.sku.id])
+        delete_sku_cards([self.sku.id])
+
+    def get_checkout(self):
+        """
+        请求结算接口, 统计所有数据库上执行的SQL语句数
+        """
+        with ExitStack() as stack:
+            queries = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            response = self.client.get('/orders/checkout/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['skus']), 1)
+        return sum(len(captured) for captured in queries)
+
+    def test_cold_cache(self):
+        # 地址, 商品卡片, 运费规则各一条
+        delete_sku_cards([self.sku.id])
+        freight_calculator.table = None
+        self.assertEqual(self.get_checkout(), 3)
+
+    def test_warm_cache(self):
+        # 卡片和运费表都已缓存时只查询地址
+        self.get_checkout()
+        self.assertEqual(self.get_checkout(), 1)
@@ -0,0 +1,124 @@
+"""
+异步下单的排队凭证(ticket)
+
+    order_ticket_<ticket>:  hash { user_id, status, order_id, message }
+    order_tickets_queued:   zset { ticket: 过期时间 } 排队中的凭证, 用于限制排队数量
+    order_ticket_done_<ticket>: list 下单完成时写入一条数据, 用于长轮询等待, 等待者取出后放回
+
+状态: queued 排队中 -> processing 下单中 -> succeeded 成功 / failed 失败
+"""
+import time
+import uuid
+
+from django_redis import get_redis_connection
+
+from orders import constants
+
+
+QUEUED_KEY = 'order_tickets_queued'
+
+STATUS_QUEUED = 'queued'
+STATUS_PROCESSING = 'processing'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """
+    排队人数达到上限
+    """
+    pass
+
+
+def ticket_key(ticket):
+    return 'order_ticket_%s' % ticket
+
+
+def done_key(ticket):
+    return 'order_ticket_done_%s' % ticket
+
+
+def create_ticket(user_id, redis_conn=None):
+    """
+    生成排队凭证
+    :raise QueueFull: 排队中的凭证达到ORDER_QUEUE_MAX_SIZE
+    """
+    redis_conn = redis_conn or get_redis_connection('default')
+    now = time.time()
+
+    # 先清除过期(worker没有处理)的凭证, 再统计排队数量
+    pl = redis_conn.pipeline()
+    pl.zremrangebyscore(QUEUED_KEY, '-inf', now)
+    pl.zcard(QUEUED_KEY)
+    if pl.execute()[-1] >= constants.ORDER_QUEUE_MAX_SIZE:
+        raise QueueFull()
+
+    ticket = uuid.uuid4().hex
+    pl = redis_conn.pipeline()
+    pl.hmset(ticket_key(ticket), {'user_id': user_id, 'status': STATUS_QUEUED})
+    pl.expire(ticket_key(ticket), constants.ORDER_TICKET_EXPIRES)
+    # note--redis-py 2.x和3.x的zadd参数不同, 直接使用命令
+    pl.execute_command('ZADD', QUEUED_KEY, now + constants.ORDER_TICKET_EXPIRES, ticket)
+    pl.execute()
+    return ticket
+
+
+def get_ticket(ticket, redis_conn=None):
+    """
+    :return: { status, order_id, message, user_id }, 凭证不存在或已过期时返回None
+    """
+    redis_conn = redis_conn or get_redis_connection('default')
+    data = redis_conn.hgetall(ticket_key(ticket))
+    if not data:
+        return None
+    return dict((key.decode(), value.decode()) for key, value in data.items())
+
+
+def wait_ticket(ticket, timeout, redis_conn=None):
+    """
+    等待下单完成, 最多等待timeout秒
+    """
+    redis_conn = redis_conn or get_redis_connection('default')
+    data = get_ticket(ticket, redis_conn)
+    if data is None or data['status'] in (STATUS_SUCCEEDED, STATUS_FAILED) or timeout <= 0:
+        return data
+
+    # 阻塞等待worker的完成通知, 不需要反复查询
+    if redis_conn.blpop(done_key(ticket), timeout) is not None:
+        # note--通知只有一条, 取出后放回, 同一凭证的其他长轮询(客户端重试, 多个页面)也能立即返回
+        # note--列表取空后键已被删除, 需要重新设置有效期
+        pl = redis_conn.pipeline()
+        pl.rpush(done_key(ticket), 1)
+        pl.expire(done_key(ticket), constants.ORDER_TICKET_MAX_WAIT)
+        pl.execute()
+    return get_ticket(ticket, redis_conn)
+
+
+def start_ticket(ticket, redis_conn=None):
+    """
+    worker开始处理凭证
+    :return: 是否需要处理, 凭证已过期或已经被处理过(任务重复投递)时返回False
+    """
+    redis_conn = redis_conn or get_redis_connection('default')
+    if not redis_conn.exists(ticket_key(ticket)):
+        return False
+    if not redis_conn.hsetnx(ticket_key(ticket), 'started', 1):
+        return False
+    redis_conn.hset(ticket_key(ticket), 'status', STATUS_PROCESSING)
+    return True
+
+
+def finish_ticket(ticket, order_id=None, message=None, redis_conn=None):
+    """
+    记录下单结果, order_id为空时表示下单失败
+    """
+    redis_conn = redis_conn or get_redis_connection('default')
+    pl = redis_conn.pipeline()
+    if order_id:
+        pl.hmset(ticket_key(ticket), {'status': STATUS_SUCCEEDED, 'order_id': order_id})
+    else:
+        pl.hmset(ticket_key(ticket), {'status': STATUS_FAILED, 'message': message or '下单失败'})
+    pl.zrem(QUEUED_KEY, ticket)
+    pl.rpush(done_key(ticket), 1)
+    pl.expire(done_key(ticket), constants.ORDER_TICKET_MAX_WAIT)
+    pl.execute()
@@ -4,6 +4,10 @@ from orders import views
 
 urlpatterns = [
     url(r'^orders/settlement/$', views.OrderSettlementView.as_view()),
+    url(r'^orders/checkout/$', views.CheckoutView.as_view()),
     url(r'^orders/$', views.SaveOrderView.as_view()),
+    url(r'^orders/async/$', views.AsyncSaveOrderView.as_view()),
+    url(r'^user/orders/$', views.UserOrdersView.as_view()),
+    url(r'^orders/tickets/(?P<ticket>[0-9a-f]{32})/$', views.OrderTicketView.as_view()),
 
 ]
\ No newline at end of file
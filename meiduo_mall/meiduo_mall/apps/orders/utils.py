@@ -0,0 +1,66 @@
+import operator
+import random
+import time
+from functools import reduce
+
+from django.db import router
+from django.db.models import F, Q
+from django_redis import get_redis_connection
+
+from goods.models import SKU
+from meiduo_mall.utils.exceptions import logger
+from meiduo_mall.utils.models import case_by_id
+from orders import constants
+
+
+def deduct_stocks(skus, cart):
+    """
+    一条UPDATE语句完成多个SKU的库存扣减(乐观锁), 销量由goods.sales异步累计
+
+    UPDATE tb_sku SET stock = stock - CASE id WHEN .. END
+    WHERE (id = 1 AND stock = 原始库存) OR (id = 2 AND stock = 原始库存) ...
+
+    :param skus: 查询出的SKU对象, stock为查询时的原始库存
+    :param cart: { sku_id: count }
+    :return: 是否所有SKU都更新成功, 只要有一个SKU的库存在查询之后被修改过就返回False
+    """
+    counts = dict((sku.id, cart[sku.id]) for sku in skus)
+    condition = reduce(operator.or_, [Q(id=sku.id, stock=sku.stock) for sku in skus])
+    ret = SKU.objects.filter(condition).update(stock=F('stock') - case_by_id(counts))
+    return ret == len(skus)
+
+
+def find_stock_conflicts(skus, cart):
+    """
+    扣减库存失败后(回滚之前)找出被其他订单修改过库存的SKU
+
+    本事务已更新的行库存为 原始库存 - 购买数量, 其余的行就是发生冲突的行
+    note--必须在主库上查询, 才能看到本事务中未提交的更新
+    :return: 冲突的sku_id列表
+    """
+    stocks = dict(SKU.objects.using(router.db_for_write(SKU)).filter(
+        id__in=[sku.id for sku in skus]).values_list('id', 'stock'))
+    return [sku.id for sku in skus if stocks.get(sku.id) != sku.stock - cart[sku.id]]
+
+
+def record_stock_conflicts(sku_ids):
+    """
+    累计每个SKU的库存冲突次数, 用于查看哪些商品下单竞争激烈
+    """
+    if not sku_ids:
+        return
+    logger.warning('下单扣减库存冲突 sku: %s' % ','.join(str(sku_id) for sku_id in sku_ids))
+    redis_conn = get_redis_connection('default')
+    pl = redis_conn.pipeline()
+    for sku_id in sku_ids:
+        pl.hincrby(constants.ORDER_STOCK_CONFLICTS_KEY, sku_id, 1)
+    pl.execute()
+
+
+def wait_before_retry(conflicts):
+    """
+    冲突后随机等待一段时间再重试, 等待上限随冲突次数指数增长, 避免同时冲突的请求再次同时重试
+    :param conflicts: 已经冲突的次数
+    """
+    backoff = min(constants.ORDER_STOCK_RETRY_BACKOFF * 2 ** (conflicts - 1), constants.ORDER_STOCK_RETRY_BACKOFF_MAX)
+    time.sleep(random.uniform(0, backoff))
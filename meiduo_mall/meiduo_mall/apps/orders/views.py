@@ -1,24 +1,34 @@
+import math
+
 import redis
-from decimal import Decimal
 from django.shortcuts import render
-from django_redis import get_redis_connection
-from rest_framework.generics import CreateAPIView
+from rest_framework import status
+from rest_framework.generics import CreateAPIView, ListAPIView
 from rest_framework.response import Response
 
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
 
-from goods.models import SKU
-from orders.serializers import OrderSettlementSerializer, SaveOrderSerializer
+from carts.storage import get_cart_storage
+from celery_tasks.order_queue import place_order
+from goods.cache import get_sku_cards
+from orders import constants
+from orders.freight import calculate_freight
+from meiduo_mall.utils.idempotency import idempotent
+from meiduo_mall.utils.pagination import KeysetPagination
+from orders.models import OrderInfo
+from orders.serializers import OrderSettlementSerializer, SaveOrderSerializer, OrderListSerializer, CheckoutSerializer
+from orders.tickets import create_ticket, wait_ticket, QueueFull
+from users.models import Address
 
 
 # tips--订单结算页面
 class OrderSettlementView(APIView):
     """
     订单结算页面所需的数据从购物车中勾选而来
-    请求方式: GET /orders/settlement/
-    请求参数: 无
+    请求方式: GET /orders/settlement/?address=地址id
+    请求参数: address 可选, 计算运费使用的收货地址, 默认为用户的默认地址
     返回数据: JSON
 
     """
@@ -49,25 +59,25 @@ class OrderSettlementView(APIView):
         #     sku_list.append(sku)
 
         # 从购物车中获取用户勾选要结算的商品信息
-        redis_conn = get_redis_connection('cart')
-        redis_cart = redis_conn.hgetall('cart_%s' % user.id)
-        cart_selected = redis_conn.smembers('cart_selected_%s' % user.id)
-
-        cart = {}
-
         # tips--构造一个　{ sku_id: count } 的数据格式
-        for sku_id in cart_selected:
-            cart[int(sku_id)] = int(redis_cart[sku_id])
+        cart = get_cart_storage(user.id).get_selected()
 
         # 查询商品信息, 并添加额外的字段
         # note--python中字典和类的实例对象是不一样的!
         # note--类的实例对象是可以通过点操作熟悉的, 也是可变类型
-        skus = SKU.objects.filter(id__in=cart.keys())
+        # note--商品信息从缓存的卡片中获取, 卡片是字典, 序列化器同样可以处理
+        skus = list(get_sku_cards(cart.keys()).values())
         for sku in skus:
-            sku.count = cart[sku.id]
+            sku['count'] = cart[sku['id']]
 
         # 运费, Decimal运算速度慢, 但是精度高
-        freight = Decimal('10.00')
+        # note--与下单时使用同一个地址的运费规则: 请求参数address指定的地址, 没有时使用默认地址
+        address_id = request.query_params.get('address') or user.default_address_id
+        address = None
+        if address_id and str(address_id).isdigit():
+            address = Address.objects.filter(id=address_id, user=user, is_deleted=False).only(
+                'province_id', 'city_id').first()
+        freight = calculate_freight(address, [(sku['price'], sku['weight'], sku['count']) for sku in skus])
 
         # 直接只序列化商品也可以
         # 构造一个对象即可, 单独序列化skus
@@ -75,6 +85,50 @@ class OrderSettlementView(APIView):
         return Response(serializer.data)
 
 
+# tips--结算页面初始化
+class CheckoutView(APIView):
+    """
+    结算页面需要的所有数据: 勾选的商品, 收货地址, 默认地址, 运费, 用户信息, 一次请求返回
+    原来需要分别请求 /addresses/, /orders/settlement/, /user/, 每个请求都要校验JWT并查询数据库
+    请求方式: GET /orders/checkout/
+    返回数据: JSON {user, default_address_id, addresses, freight, skus}, 每个地址附带寄往该地址的运费freight
+    SQL语句数: JWT认证查询用户和查询地址共两条; 商品卡片未缓存时多一条查询SKU, 本进程运费表需要重新加载时多一条查询运费规则
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+
+        # 购物车一次读取, 商品卡片优先从缓存读取
+        cart = get_cart_storage(user.id).get_selected()
+        skus = list(get_sku_cards(cart.keys()).values())
+        for sku in skus:
+            sku['count'] = cart[sku['id']]
+
+        # note--省市区名称和地址在一条查询中取出, 序列化时不会每个地址再查询三次
+        addresses = list(user.addresses.filter(is_deleted=False).select_related('province', 'city', 'district'))
+
+        # 运费按每个地址分别计算, 切换地址时前端不需要再次请求
+        lines = [(sku['price'], sku['weight'], sku['count']) for sku in skus]
+        freight = calculate_freight(None, lines)
+        default_address_id = None
+        for address in addresses:
+            address.freight = calculate_freight(address, lines)
+            # 默认地址被删除后不再返回
+            if address.id == user.default_address_id:
+                default_address_id = address.id
+                freight = address.freight
+
+        serializer = CheckoutSerializer({
+            'user': user,
+            'default_address_id': default_address_id,
+            'addresses': addresses,
+            'freight': freight,
+            'skus': skus,
+        })
+        return Response(serializer.data)
+
+
 # tips--保存订单页面
 class SaveOrderView(CreateAPIView):
     """
@@ -83,3 +137,88 @@ class SaveOrderView(CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = SaveOrderSerializer
 
+    # tips--客户端超时重试时携带相同的Idempotency-Key, 直接返回第一次下单的结果, 不会重复下单
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+
+# tips--用户订单列表
+class UserOrdersView(ListAPIView):
+    """
+    用户的订单列表, 按下单时间倒序, 使用游标分页
+    请求方式: GET /user/orders/?status=订单状态&cursor=游标&page_size=每页数量
+    返回数据: JSON {next: 下一页地址, results: [订单]}
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = OrderListSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = OrderInfo.objects.filter(user=self.request.user)
+
+        status_value = self.request.query_params.get('status')
+        if status_value:
+            queryset = queryset.filter(status=status_value if status_value.isdigit() else -1)
+
+        # note--订单商品和SKU各用一条查询一次性加载, 不会每个订单查询一次
+        return queryset.prefetch_related('skus__sku')
+
+
+# tips--异步下单
+class AsyncSaveOrderView(APIView):
+    """
+    异步保存订单, 校验参数后把下单请求放入队列, 立即返回排队凭证, 由celery worker完成下单
+    同步下单 POST /orders/ 仍然是默认的下单方式
+    请求方式: POST /orders/async/
+    请求参数: address, pay_method
+    返回数据: JSON {ticket, status}
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request):
+        serializer = SaveOrderSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        # 排队人数过多时直接拒绝, 不再放入队列
+        try:
+            ticket = create_ticket(request.user.id)
+        except QueueFull:
+            return Response({'message': '下单人数过多, 请稍后重试'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        place_order.delay(ticket, request.user.id, serializer.validated_data['address'].id,
+                          serializer.validated_data['pay_method'])
+
+        return Response({'ticket': ticket, 'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+
+
+class OrderTicketView(APIView):
+    """
+    查询异步下单的结果
+    请求方式: GET /orders/tickets/(?P<ticket>[0-9a-f]{32})/?wait=秒数
+    请求参数: wait 可选, 下单未完成时最多等待的秒数, 不超过ORDER_TICKET_MAX_WAIT
+    返回数据: JSON {ticket, status, order_id, message}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, ticket):
+        # 等待时间限制在 0 ~ ORDER_TICKET_MAX_WAIT 之间, nan/inf等无法解析的值按0处理
+        try:
+            wait = float(request.query_params.get('wait', 0))
+            if not math.isfinite(wait):
+                raise ValueError
+            wait = int(max(0, min(wait, constants.ORDER_TICKET_MAX_WAIT)))
+        except ValueError:
+            wait = 0
+
+        data = wait_ticket(ticket, wait)
+        if data is None or data['user_id'] != str(request.user.id):
+            return Response({'message': '凭证不存在或已过期'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'ticket': ticket,
+            'status': data['status'],
+            'order_id': data.get('order_id'),
+            'message': data.get('message'),
+        })
@@ -0,0 +1,2 @@
+# 已处理的支付宝通知在redis中的保存时间(秒), 重复通知直接返回
+PAYMENT_DONE_CACHE_EXPIRES = 24 * 60 * 60
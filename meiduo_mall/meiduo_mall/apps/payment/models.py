@@ -10,7 +10,8 @@ class Payment(BaseModel):
     """
     支付信息
     """
-    order = models.ForeignKey(OrderInfo, on_delete=models.CASCADE, verbose_name='订单')
+    # tips--一个订单只能有一条支付记录, 避免支付宝重复通知或重复支付时重复处理
+    order = models.OneToOneField(OrderInfo, on_delete=models.CASCADE, verbose_name='订单')
     trade_id = models.CharField(max_length=100, unique=True, null=True, blank=True, verbose_name="支付编号")
 
     class Meta:
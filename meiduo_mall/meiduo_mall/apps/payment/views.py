@@ -2,14 +2,19 @@ import os
 
 from alipay import AliPay
 from django.conf import settings
+from django.db import transaction, router
 from django.shortcuts import render
+from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from meiduo_mall.utils.exceptions import logger
+from orders.expiry import unschedule_expire
 from orders.models import OrderInfo
-
+from orders.rollups import record_order_paid
+from payment import constants
 
 # tips--发起支付
 from payment.models import Payment
@@ -80,11 +85,36 @@ class PaymentStatusView(APIView):
             order_id = data.get('out_trade_no')
             # 支付宝支付流水号
             trade_id = data.get('trade_no')
-            Payment.objects.create(
-                order_id=order_id,
-                trade_id=trade_id
-            )
-            OrderInfo.objects.filter(order_id=order_id, status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']).update(status=OrderInfo.ORDER_STATUS_ENUM["UNCOMMENT"])
+
+            # 重复通知直接返回, 不再访问数据库
+            redis_conn = get_redis_connection('default')
+            if redis_conn.get('payment_done_%s' % trade_id):
+                return Response({'trade_id': trade_id})
+
+            # tips--订单上有唯一约束, 同时到达的重复通知只有一个能创建支付记录
+            # note--支付记录和订单状态在同一事务中修改, 不会出现有支付记录而订单仍是未支付的情况
+            with transaction.atomic():
+                payment, created = Payment.objects.get_or_create(order_id=order_id, defaults={'trade_id': trade_id})
+                if not created and payment.trade_id != trade_id:
+                    # 同一个订单支付了两次, 需要人工退款
+                    logger.error('订单%s重复支付, 已有支付宝支付%s, 收到支付宝支付%s' % (order_id, payment.trade_id, trade_id))
+                    return Response({'trade_id': trade_id})
+
+                # 重复通知时订单已经是待评价, 不会再次修改
+                ret = OrderInfo.objects.filter(order_id=order_id, status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']).update(status=OrderInfo.ORDER_STATUS_ENUM["UNCOMMENT"])
+                if ret:
+                    # 累加订单统计中的支付数据
+                    # note--提交后再累加, 支付事务不持有所有支付通知共用的汇总行的锁; 订单从主库读取, 不受从库延迟影响
+                    order = OrderInfo.objects.using(router.db_for_write(OrderInfo)).only(
+                        'order_id', 'create_time', 'total_amount').get(order_id=order_id)
+                    transaction.on_commit(lambda: record_order_paid(order))
+                elif created:
+                    # 订单已经超时取消, 需要人工退款
+                    logger.error('订单%s已取消, 收到支付宝支付%s' % (order_id, trade_id))
+
+            # 已支付的订单不再自动取消
+            unschedule_expire(order_id)
+            redis_conn.setex('payment_done_%s' % trade_id, constants.PAYMENT_DONE_CACHE_EXPIRES, 1)
             return Response({'trade_id': trade_id})
         else:
             return Response({'message': '非法请求'}, status=status.HTTP_403_FORBIDDEN)
\ No newline at end of file
@@ -12,7 +12,7 @@ from rest_framework import mixins
 from rest_framework_jwt.views import ObtainJSONWebToken
 
 from carts.utils import merge_cart_cookie_to_redis
-from goods.models import SKU
+from goods.cache import get_sku_cards
 from goods.serializers import SKUSerializer
 from users import constants
 from users import serializers
@@ -186,15 +186,10 @@ class UserBrowsingHistoryView(CreateAPIView):
 
         redis_conn = get_redis_connection("history")
         history = redis_conn.lrange("history_%s" % user_id, 0, constants.USER_BROWSING_HISTORY_COUNTS_LIMIT - 1)
-        skus = []
 
-        print(history)
-        # note--为了保持查询出的顺序与用户的浏览历史保存顺序一致
-        for sku_id in history:
-
-            # 查询出的为字节类型
-            sku = SKU.objects.get(id=sku_id)
-            skus.append(sku)
+        # note--为了保持查询出的顺序与用户的浏览历史保存顺序一致, 卡片按照history的顺序返回
+        # 查询出的为字节类型, 批量从缓存中获取
+        skus = list(get_sku_cards(history).values())
 
         s = SKUSerializer(skus, many=True)
         return Response(s.data)
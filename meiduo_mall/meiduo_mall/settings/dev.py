@@ -71,6 +71,9 @@ CORS_ORIGIN_WHITELIST = (
     'www.meiduo.site'
 )
 CORS_ALLOW_CREDENTIALS = True  # 允许携带cookie
+# 允许前端携带下单幂等请求头
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = default_headers + ('idempotency-key',)
 
 ALLOWED_HOSTS = ['api.meiduo.site', '127.0.0.1', 'localhost', 'www.meiduo.site']
 
@@ -164,6 +167,22 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
+    },
+    # 商品数据缓存
+    "goods": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/5",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
+    # 秒杀商品预扣库存, 不能被淘汰, 需要开启持久化
+    "stock": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/6",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
     }
 }
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
@@ -0,0 +1,44 @@
+"""
+下单压测(scripts/load_test_orders.py)使用的配置, 在dev配置的基础上修改数据库和redis, 不影响开发数据
+
+环境变量:
+    LOADTEST_DB:        sqlite(默认) 使用本地sqlite文件, mysql 使用下面的MySQL库
+    LOADTEST_DB_NAME:   sqlite文件路径或MySQL库名
+    LOADTEST_REDIS_URL: redis地址, 默认 redis://127.0.0.1:6379, 使用7~13号库
+
+note--sqlite同一时间只允许一个写事务, 也不支持select_for_update, 只适合检查正确性, 对比性能请使用MySQL
+"""
+from .dev import *
+
+
+if os.getenv('LOADTEST_DB', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('LOADTEST_DB_NAME', os.path.join(BASE_DIR, 'loadtest.sqlite3')),
+            # 写锁的等待时间(秒)
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'HOST': os.getenv('LOADTEST_DB_HOST', '127.0.0.1'),
+            'PORT': int(os.getenv('LOADTEST_DB_PORT', 3306)),
+            'USER': os.getenv('LOADTEST_DB_USER', 'meiduo002'),
+            'PASSWORD': os.getenv('LOADTEST_DB_PASSWORD', 'meiduo'),
+            'NAME': os.getenv('LOADTEST_DB_NAME', 'meiduo_loadtest'),
+        }
+    }
+
+# 压测只有一个数据库, 读写都在同一个库
+DATABASE_ROUTERS = []
+
+# 每个缓存使用单独的库, 7~13号库, 避开开发数据(0~6)和celery(14, 15)
+LOADTEST_REDIS_URL = os.getenv('LOADTEST_REDIS_URL', 'redis://127.0.0.1:6379')
+for index, alias in enumerate(['default', 'session', 'verify_codes', 'history', 'cart', 'goods', 'stock']):
+    CACHES[alias]['LOCATION'] = '%s/%d' % (LOADTEST_REDIS_URL, 7 + index)
+
+# 压测时不输出每次下单冲突的日志
+LOGGING['loggers']['django']['level'] = 'ERROR'
@@ -0,0 +1,100 @@
+"""
+接口幂等
+
+客户端在请求头中携带 Idempotency-Key, 同一用户同一接口使用相同的key重复请求时, 直接返回第一次请求的响应, 不再重复执行
+    idempotency_<sha1(用户, 路径, key)>:  string json {state, body_hash, status, data}
+
+1. 第一次请求: 写入processing状态后执行视图, 响应保存IDEMPOTENCY_EXPIRES秒;
+   视图抛出异常(包括参数校验失败)或返回5xx时删除, 允许客户端重试
+2. 第一次请求还在执行时: 返回409
+3. 第一次请求已完成: 返回保存的响应, 响应头 Idempotent-Replayed: true
+4. 相同key但请求参数不同: 返回422
+不带请求头的请求不受影响
+"""
+import functools
+import hashlib
+import json
+
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+# 保存响应的时间(秒)
+IDEMPOTENCY_EXPIRES = 24 * 60 * 60
+
+# processing状态的有效期(秒), 进程在执行中崩溃时, 超过该时间后允许重试
+IDEMPOTENCY_PROCESSING_EXPIRES = 60
+
+# key的最大长度
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+
+
+def idempotency_key(request, key):
+    user_id = request.user.id if request.user.is_authenticated else ''
+    value = '%s|%s|%s' % (user_id, request.path, key)
+    return 'idempotency_%s' % hashlib.sha1(value.encode()).hexdigest()
+
+
+def body_hash(request):
+    return hashlib.sha1(json.dumps(request.data, sort_keys=True, cls=JSONEncoder).encode()).hexdigest()
+
+
+def idempotent(func):
+    """
+    视图处理方法的装饰器, 在认证之后执行, 所以key可以按用户区分
+        @idempotent
+        def post(self, request, *args, **kwargs):
+    """
+    @functools.wraps(func)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return func(view, request, *args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response({'message': 'Idempotency-Key过长'}, status=status.HTTP_400_BAD_REQUEST)
+
+        redis_conn = get_redis_connection('default')
+        redis_key = idempotency_key(request, key)
+        request_hash = body_hash(request)
+
+        processing = json.dumps({'state': 'processing', 'body_hash': request_hash})
+        if not redis_conn.set(redis_key, processing, nx=True, ex=IDEMPOTENCY_PROCESSING_EXPIRES):
+            saved = redis_conn.get(redis_key)
+            if saved is None:
+                # 刚好过期, 按冲突处理, 由客户端重试
+                return Response({'message': '请求正在处理'}, status=status.HTTP_409_CONFLICT)
+
+            saved = json.loads(saved.decode())
+            if saved['body_hash'] != request_hash:
+                return Response({'message': 'Idempotency-Key已用于其他请求'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if saved['state'] == 'processing':
+                return Response({'message': '请求正在处理'}, status=status.HTTP_409_CONFLICT)
+
+            response = Response(saved['data'], status=saved['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = func(view, request, *args, **kwargs)
+        except Exception:
+            redis_conn.delete(redis_key)
+            raise
+
+        # 服务器错误不保存, 允许重试
+        if response.status_code >= 500:
+            redis_conn.delete(redis_key)
+        else:
+            redis_conn.set(redis_key, json.dumps({
+                'state': 'done',
+                'body_hash': request_hash,
+                'status': response.status_code,
+                'data': response.data,
+            }, cls=JSONEncoder), ex=IDEMPOTENCY_EXPIRES)
+        return response
+
+    return wrapper
@@ -6,4 +6,15 @@ class BaseModel(models.Model):
     update_time = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
     class Meta:
-        abstract = True  # 说明是抽象模型类, 用于继承使用，数据库迁移时不会创建BaseModel的表
\ No newline at end of file
+        abstract = True  # 说明是抽象模型类, 用于继承使用，数据库迁移时不会创建BaseModel的表
+
+def case_by_id(values, output_field=None):
+    """
+    构造 CASE id WHEN .. THEN .. END 表达式, 用于在一条UPDATE语句中给多行设置不同的值
+    例: SKU.objects.filter(id__in=counts).update(stock=F('stock') - case_by_id(counts))
+    :param values: { id: value }
+    """
+    return models.Case(
+        *[models.When(id=pk, then=models.Value(value)) for pk, value in values.items()],
+        output_field=output_field or models.IntegerField()
+    )
@@ -1,7 +1,125 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 2
     page_size_query_param = 'page_size'
     max_page_size = 20
+
+
+class CountedPaginator(Paginator):
+    """
+    使用已知的总数, 不再执行COUNT(*)
+    """
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+
+    @property
+    def count(self):
+        return self.known_count
+
+
+class KeysetPagination(BasePagination):
+    """
+    按 (排序字段, 主键) 的游标分页, 默认按时间倒序, 下一页的条件为
+        time < 上一页最后一条的时间 OR (time = 上一页最后一条的时间 AND pk < 上一页最后一条的主键)
+    配合 (过滤字段, 排序字段) 索引, 无论翻到第几页都只需要读取一页的数据, 不会像OFFSET那样扫描前面所有的行
+
+    note--只支持向后翻页, 上一页由前端记录之前的游标
+    """
+    time_field = 'create_time'
+    pk_field = 'pk'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+
+    def get_ordering(self, request, queryset, view):
+        """
+        :return: (排序字段, 是否倒序), 子类可以根据请求参数使用其他排序字段
+        """
+        return self.time_field, True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        self.field, descending = self.get_ordering(request, queryset, view)
+        prefix, lookup = ('-', '__lt') if descending else ('', '__gt')
+        queryset = queryset.order_by(prefix + self.field, prefix + self.pk_field)
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            value, pk = cursor
+            queryset = queryset.filter(
+                Q(**{self.field + lookup: value}) |
+                Q(**{self.field: value, self.pk_field + lookup: pk})
+            )
+
+        # 多取一条用于判断是否还有下一页
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        value = request.query_params.get(self.cursor_query_param)
+        if not value:
+            return None
+        try:
+            value, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|', 1)
+            # 按模型字段的类型解析, 时间, 价格, 销量等字段都可以使用
+            value = model._meta.get_field(self.field).to_python(value)
+            pk = model._meta.pk.to_python(pk)
+        except (ValueError, UnicodeDecodeError, binascii.Error, ValidationError):
+            raise NotFound('无效的游标')
+        if value is None:
+            raise NotFound('无效的游标')
+        return value, pk
+
+    def encode_cursor(self, item):
+        value = getattr(item, self.field)
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        return base64.urlsafe_b64encode(('%s|%s' % (value, item.pk)).encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+
+class OrderingKeysetPagination(KeysetPagination):
+    """
+    按OrderingFilter的排序参数进行游标分页, 每个排序字段都以主键作为第二排序字段
+    note--需要为每个排序字段建立 (过滤字段, 排序字段, 主键) 的联合索引
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = OrderingFilter().get_ordering(request, queryset, view)
+        if not ordering:
+            return super().get_ordering(request, queryset, view)
+        return ordering[0].lstrip('-'), ordering[0].startswith('-')
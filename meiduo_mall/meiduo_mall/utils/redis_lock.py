@@ -0,0 +1,36 @@
+"""
+redis中的简单互斥锁
+
+加锁时写入随机的token, 释放时只删除自己的token, 持有锁的进程超过有效期后,
+不会误删已经被其他进程重新获得的锁
+"""
+import uuid
+
+
+# 释放锁 KEYS: 锁的键; ARGV: 加锁时的token
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def acquire_lock(redis_conn, key, expires):
+    """
+    获取锁
+    :param expires: 锁的有效期(秒), 持有锁的进程崩溃时, 超过该时间后其他进程可以重新获得
+    :return: 获得锁时返回token, 用于释放锁; 锁被其他进程持有时返回None
+    """
+    token = uuid.uuid4().hex
+    if redis_conn.set(key, token, nx=True, ex=expires):
+        return token
+    return None
+
+
+def release_lock(redis_conn, key, token):
+    """
+    释放锁, 锁已过期并被其他进程获得时不删除
+    :return: 是否释放了自己的锁
+    """
+    return bool(redis_conn.register_script(RELEASE_SCRIPT)(keys=[key], args=[token]))
@@ -0,0 +1,110 @@
+"""
+接口响应缓存
+
+响应按key_func返回的键保存在redis中, 键中包含数据的版本号, 数据修改后递增版本号, 旧的缓存不再被读取, 等待自然过期
+    <key>:       string json {etag, data}
+    <key>_lock:  string 正在生成该缓存的请求持有的锁, 值为随机token, 只有持有者可以删除
+    <key>_miss:  string 获得锁的请求已经执行完但没有写入缓存(非200响应或异常)
+
+1. 命中缓存: 直接返回保存的数据, 请求头If-None-Match与ETag相同时返回304, 不再传输数据
+2. 未命中: 只有获得锁的请求执行视图并写入缓存, 其他请求等待缓存写入后读取, 避免缓存过期时大量请求同时查询数据库
+   生成缓存的请求没有写入缓存或等待超时(生成缓存的请求太慢)时自己执行视图, 不写入缓存
+只缓存200响应
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from meiduo_mall.utils.redis_lock import acquire_lock, release_lock
+
+
+# 生成缓存的锁的有效期(秒), 持有锁的进程崩溃时, 超过该时间后其他请求可以重新生成
+RESPONSE_CACHE_LOCK_EXPIRES = 10
+
+# 未获得锁的请求等待缓存写入的检查间隔(秒)和次数
+RESPONSE_CACHE_WAIT_INTERVAL = 0.05
+RESPONSE_CACHE_WAIT_TIMES = 40
+
+# 没有写入缓存的标记的有效期(秒), 不短于等待时间即可
+RESPONSE_CACHE_MISS_EXPIRES = 5
+
+
+def etag_matches(request, etag):
+    value = request.META.get('HTTP_IF_NONE_MATCH')
+    if not value:
+        return False
+    return value.strip() == '*' or etag in [tag.strip() for tag in value.split(',')]
+
+
+def make_response(request, cached):
+    """
+    根据缓存的数据构造响应
+    """
+    if etag_matches(request, cached['etag']):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(cached['data'])
+    response['ETag'] = cached['etag']
+    return response
+
+
+def cache_response(key_func, timeout, alias='default'):
+    """
+    视图处理方法的装饰器
+        @cache_response(key_func, 60 * 5)
+        def get(self, request, *args, **kwargs):
+    :param key_func: key_func(view, request, *args, **kwargs) 返回缓存的键
+    :param timeout: 缓存有效期(秒)
+    :param alias: 使用的redis配置
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            redis_conn = get_redis_connection(alias)
+            key = key_func(view, request, *args, **kwargs)
+
+            value = redis_conn.get(key)
+            if value is None:
+                lock_key = key + '_lock'
+                miss_key = key + '_miss'
+                token = acquire_lock(redis_conn, lock_key, RESPONSE_CACHE_LOCK_EXPIRES)
+                if token:
+                    cached = None
+                    # 清除上一次没有写入缓存的标记, 等待的请求不会因为旧的标记提前执行视图
+                    redis_conn.delete(miss_key)
+                    try:
+                        response = func(view, request, *args, **kwargs)
+                        if response.status_code != status.HTTP_200_OK:
+                            return response
+                        data = json.dumps(response.data, cls=JSONEncoder)
+                        cached = {'etag': '"%s"' % hashlib.sha1(data.encode()).hexdigest(), 'data': json.loads(data)}
+                        redis_conn.setex(key, timeout, json.dumps(cached))
+                    finally:
+                        # note--没有写入缓存时先写入标记再释放锁, 等待的请求立即自己执行视图, 不用等到超时
+                        if cached is None:
+                            redis_conn.setex(miss_key, RESPONSE_CACHE_MISS_EXPIRES, 1)
+                        release_lock(redis_conn, lock_key, token)
+                    return make_response(request, cached)
+
+                # 其他请求正在生成缓存, 等待写入
+                for _ in range(RESPONSE_CACHE_WAIT_TIMES):
+                    time.sleep(RESPONSE_CACHE_WAIT_INTERVAL)
+                    value, missed = redis_conn.mget(key, miss_key)
+                    if value is not None:
+                        break
+                    if missed is not None:
+                        return func(view, request, *args, **kwargs)
+                else:
+                    return func(view, request, *args, **kwargs)
+
+            return make_response(request, json.loads(value.decode()))
+
+        return wrapper
+
+    return decorator
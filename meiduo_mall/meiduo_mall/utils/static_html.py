@@ -0,0 +1,116 @@
+"""
+静态html文件写入
+
+1. 先写入同目录下的临时文件, 再用os.replace替换目标文件, nginx不会读到写了一半的页面
+2. 新内容的摘要与磁盘上文件的摘要相同且压缩文件都存在时不再写入, 文件的修改时间不变, CDN和系统缓存不会失效
+   note--只和本机磁盘上的文件比较, 多台服务器各自生成页面, redis清空也不会误判
+3. 同时生成预压缩的.gz文件(nginx gzip_static), 安装了brotli时再生成.br文件(nginx brotli_static)
+
+内容有变化的页面记录在redis中, 由CDN刷新任务取出后刷新:
+    static_html_purge:  set 待刷新CDN的页面路径(相对GENERATED_STATIC_HTML_FILES_DIR)
+"""
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+PURGE_KEY = 'static_html_purge'
+
+# 生成的文件权限, 临时文件默认只有属主可读, nginx需要读取
+STATIC_HTML_FILE_MODE = 0o644
+
+
+def atomic_write(file_path, content):
+    """
+    先写临时文件再替换, 替换之前其他进程读到的始终是完整的旧文件
+    """
+    dir_name = os.path.dirname(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, STATIC_HTML_FILE_MODE)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def gzip_compress(content):
+    # note--mtime固定为0, 相同内容生成的.gz文件完全相同
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as f:
+        f.write(content)
+    return buf.getvalue()
+
+
+def file_digest(file_path):
+    """
+    磁盘上文件内容的sha1, 文件不存在时返回None
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def write_static_html(path, html_text):
+    """
+    写入静态html文件
+    :param path: 相对GENERATED_STATIC_HTML_FILES_DIR的路径, 如 goods/1.html
+    :param html_text: 页面内容
+    :return: 内容是否有变化, 有变化的页面才需要刷新CDN
+    """
+    content = html_text.encode('utf-8')
+    digest = hashlib.sha1(content).hexdigest()
+    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, path)
+
+    compressed_paths = [file_path + '.gz'] + ([file_path + '.br'] if brotli is not None else [])
+    if file_digest(file_path) == digest and all(os.path.exists(compressed_path) for compressed_path in compressed_paths):
+        return False
+
+    # 先替换压缩文件, 再替换页面
+    atomic_write(file_path + '.gz', gzip_compress(content))
+    if brotli is not None:
+        atomic_write(file_path + '.br', brotli.compress(content))
+    atomic_write(file_path, content)
+    return True
+
+
+def delete_static_html(path):
+    """
+    删除静态html文件及其压缩文件
+    :param path: 相对GENERATED_STATIC_HTML_FILES_DIR的路径
+    :return: 是否删除了文件
+    """
+    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, path)
+    deleted = False
+    # 先删除页面, 再删除压缩文件
+    for name in (file_path, file_path + '.gz', file_path + '.br'):
+        try:
+            os.unlink(name)
+            deleted = True
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def queue_cdn_purge(paths):
+    """
+    记录内容有变化, 需要刷新CDN的页面
+    :param paths: 相对GENERATED_STATIC_HTML_FILES_DIR的路径列表
+    """
+    paths = list(paths)
+    if paths:
+        get_redis_connection('default').sadd(PURGE_KEY, *paths)
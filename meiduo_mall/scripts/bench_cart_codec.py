@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""
+功能：对比购物车cookie新旧两种编码格式的编解码耗时和cookie大小
+使用方法:
+    ./bench_cart_codec.py [购物车商品条数] [循环次数]
+"""
+import os
+import random
+import sys
+import timeit
+
+# 编解码模块只依赖标准库, 不需要启动django
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../meiduo_mall/apps'))
+
+from carts.codec import get_cart_codec
+
+
+def build_cart(lines):
+    """
+    构造一个包含lines条商品的购物车
+    """
+    cart = {}
+    for sku_id in random.sample(range(1, 200000), lines):
+        cart[sku_id] = {
+            'count': random.randint(1, 20),
+            'selected': random.random() < 0.8
+        }
+    return cart
+
+
+def bench(name, cart, number):
+    codec = get_cart_codec(name)
+    value = codec.dumps(cart)
+    assert codec.loads(value) == cart
+
+    encode_time = timeit.timeit(lambda: codec.dumps(cart), number=number) / number
+    decode_time = timeit.timeit(lambda: codec.loads(value), number=number) / number
+    print('%-8s cookie: %6d bytes  encode: %8.2f us  decode: %8.2f us' % (
+        name, len(value), encode_time * 1e6, decode_time * 1e6))
+
+
+if __name__ == '__main__':
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    number = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    random.seed(0)
+    cart = build_cart(lines)
+    print('购物车商品条数: %d, 循环次数: %d' % (lines, number))
+    for name in ('pickle', 'packed'):
+        bench(name, cart, number)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""
+功能：对比逐条处理商品的旧下单流程与批量下单流程, 每个订单执行的SQL语句数和下单耗时(p50/p99)
+每次下单都在事务中执行并回滚, 不会修改数据库中的库存和订单数据, 但会改写该用户redis中的购物车
+使用方法:
+    ./bench_order_statements.py 用户id 地址id [订单商品条数] [下单次数]
+"""
+
+import sys
+sys.path.insert(0, '../')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meiduo_mall.settings.dev'
+
+import django
+django.setup()
+
+import time
+from contextlib import ExitStack
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from carts.storage import get_cart_storage
+from goods.models import SKU
+from orders.models import OrderInfo, OrderGoods
+from orders.serializers import SaveOrderSerializer
+from users.models import User, Address
+
+
+class FakeRequest(object):
+    def __init__(self, user):
+        self.user = user
+
+
+def legacy_create(user, address, pay_method):
+    """
+    旧的下单流程: 每个商品分别查询, 更新库存, 保存SKU和SPU, 保存订单商品
+    """
+    order_id = timezone.now().strftime('%Y%m%d%H%M%S') + ('%09d' % user.id)
+    order = OrderInfo.objects.create(
+        order_id=order_id,
+        user=user,
+        address=address,
+        total_count=0,
+        total_amount=Decimal(0),
+        freight=Decimal(10),
+        pay_method=pay_method,
+        status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']
+    )
+    cart_storage = get_cart_storage(user.id)
+    cart = cart_storage.get_selected()
+    for sku_id, sku_count in cart.items():
+        while True:
+            sku = SKU.objects.get(id=sku_id)
+            ret = SKU.objects.filter(id=sku.id, stock=sku.stock).update(
+                stock=sku.stock - sku_count, sales=sku.sales + sku_count)
+            if ret == 0:
+                continue
+            sku.save()
+            sku.goods.sales += sku_count
+            sku.goods.save()
+            order.total_count += sku_count
+            order.total_amount += (sku.price * sku_count)
+            OrderGoods.objects.create(order=order, sku=sku, count=sku_count, price=sku.price)
+            break
+        order.total_amount += order.freight
+        order.save()
+    cart_storage.remove(cart.keys())
+    return order
+
+
+def batch_create(user, address, pay_method):
+    """
+    当前的批量下单流程
+    """
+    serializer = SaveOrderSerializer(context={'request': FakeRequest(user)})
+    return serializer.create({'address': address, 'pay_method': pay_method})
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def bench(name, create, user, address, skus, number):
+    cart_storage = get_cart_storage(user.id)
+    # note--读写分离时查询会发到slave, 每个数据库都要统计
+    statements = dict((alias, []) for alias in connections)
+    durations = []
+    for _ in range(number):
+        pl = cart_storage.pipeline()
+        for sku in skus:
+            cart_storage.update(sku.id, 1, True, pl)
+        pl.execute()
+
+        with transaction.atomic():
+            with ExitStack() as stack:
+                queries = dict((alias, stack.enter_context(CaptureQueriesContext(connections[alias])))
+                               for alias in statements)
+                start = time.perf_counter()
+                create(user, address, OrderInfo.PAY_METHODS_ENUM['ALIPAY'])
+                durations.append(time.perf_counter() - start)
+            for alias, captured in queries.items():
+                statements[alias].append(len(captured))
+            transaction.set_rollback(True)
+
+    per_alias = '  '.join('%s: %5.1f' % (alias, sum(counts) / number) for alias, counts in statements.items())
+    total = sum(sum(counts) for counts in statements.values()) / number
+    print('%-8s statements/order: %5.1f (%s)  p50: %8.2f ms  p99: %8.2f ms' % (
+        name, total, per_alias,
+        percentile(durations, 50) * 1000, percentile(durations, 99) * 1000))
+
+
+if __name__ == '__main__':
+    user = User.objects.get(id=int(sys.argv[1]))
+    address = Address.objects.get(id=int(sys.argv[2]), user=user)
+    lines = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    number = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+
+    skus = list(SKU.objects.filter(stock__gt=0)[:lines])
+    print('订单商品条数: %d, 下单次数: %d' % (len(skus), number))
+    bench('legacy', legacy_create, user, address, skus, number)
+    bench('batch', batch_create, user, address, skus, number)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+"""
+功能：多线程/多进程并发调用 SaveOrderSerializer.create 下单, 统计吞吐量, 下单耗时(p50/p99), 乐观锁冲突次数, 并检查是否超卖
+每次执行前重新准备压测数据: N个压测用户(每人一个地址), M个热门商品(库存重置为指定值), 删除压测用户之前的订单
+默认使用 meiduo_mall.settings.loadtest 配置(本地sqlite + 独立的redis库), 不影响开发数据, 配置说明见该文件
+使用方法:
+    先创建压测库的表: python manage.py migrate --settings=meiduo_mall.settings.loadtest
+    ./load_test_orders.py --mode threads --workers 16 --users 200 --skus 5 --stock 300 --lines 2
+    ./load_test_orders.py --reserve ...         热门商品开启redis预扣库存
+    ./load_test_orders.py --output result.jsonl 结果追加到文件, 便于修改前后对比
+"""
+
+import sys
+sys.path.insert(0, '../')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meiduo_mall.settings.loadtest'
+
+import django
+django.setup()
+
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection, connections
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from areas.models import Area
+from carts.storage import get_cart_storage
+from celery_tasks import app
+from goods.models import GoodsCategory, Brand, Goods, SKU
+from orders import reservation
+from orders.models import OrderInfo, OrderGoods
+from orders.serializers import SaveOrderSerializer
+from users.models import User, Address
+
+
+USERNAME_PREFIX = 'loadtest_'
+SKU_NAME_PREFIX = '压测商品'
+
+# 压测不依赖celery worker, 预扣库存的同步任务在订单提交后直接执行
+app.conf.update(CELERY_ALWAYS_EAGER=True)
+
+
+class CountingSaveOrderSerializer(SaveOrderSerializer):
+    """
+    记录乐观锁冲突(save_order返回None)的次数
+    """
+    conflicts = 0
+
+    def save_order(self, *args, **kwargs):
+        order = super().save_order(*args, **kwargs)
+        if order is None:
+            self.conflicts += 1
+        return order
+
+
+def seed(users, skus, stock):
+    """
+    准备压测数据, 已经存在的数据直接使用
+    :return: 压测用户的 [(user_id, address_id)], 热门商品的sku_id列表
+    """
+    area, _ = Area.objects.get_or_create(name='压测', parent=None)
+    category, _ = GoodsCategory.objects.get_or_create(name='压测', parent=None)
+    brand, _ = Brand.objects.get_or_create(name='压测', defaults={'logo': '', 'first_letter': 'Y'})
+    goods, _ = Goods.objects.get_or_create(name=SKU_NAME_PREFIX, defaults={
+        'brand': brand, 'category1': category, 'category2': category, 'category3': category})
+
+    sku_ids = []
+    for index in range(skus):
+        sku, _ = SKU.objects.get_or_create(name='%s%d' % (SKU_NAME_PREFIX, index), goods=goods, defaults={
+            'caption': '', 'category': category,
+            'price': Decimal('10.00'), 'cost_price': Decimal('5.00'), 'market_price': Decimal('12.00')})
+        sku_ids.append(sku.id)
+
+    user_addresses = []
+    for index in range(users):
+        username = '%s%d' % (USERNAME_PREFIX, index)
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            user = User.objects.create_user(username=username, password=username, mobile='199%08d' % index)
+        address = Address.objects.filter(user=user).first()
+        if address is None:
+            address = Address.objects.create(user=user, title='压测', receiver=username, province=area,
+                                             city=area, district=area, place='压测', mobile=user.mobile)
+        user_addresses.append((user.id, address.id))
+
+    # 清理上一次压测的数据, 先关闭预扣并同步剩余的预扣库存, 再重置库存
+    reservation.drain(sku_ids)
+    OrderInfo.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+    SKU.objects.filter(id__in=sku_ids).update(stock=stock)
+    return user_addresses, sku_ids
+
+
+def place_orders(args):
+    """
+    在线程或子进程中依次执行一批下单
+    :param args: (下单列表 [(user_id, address_id, { sku_id: count })], 热门商品的sku_id列表)
+    :return: [(耗时, 结果, 冲突次数)]
+    """
+    tasks, sku_ids = args
+    users = User.objects.in_bulk([user_id for user_id, _, _ in tasks])
+    addresses = Address.objects.in_bulk([address_id for _, address_id, _ in tasks])
+
+    results = []
+    try:
+        for user_id, address_id, cart in tasks:
+            cart_storage = get_cart_storage(user_id)
+            pl = cart_storage.pipeline()
+            cart_storage.remove(sku_ids, pl)
+            for sku_id, count in cart.items():
+                cart_storage.update(sku_id, count, True, pl)
+            pl.execute()
+
+            serializer = CountingSaveOrderSerializer(context={'user': users[user_id]})
+            start = time.perf_counter()
+            try:
+                serializer.create({'address': addresses[address_id], 'pay_method': OrderInfo.PAY_METHODS_ENUM['ALIPAY']})
+                outcome = 'ok'
+            except ValidationError as e:
+                outcome = str(e.detail[0])
+            except Exception as e:
+                outcome = '%s: %s' % (type(e).__name__, e)
+            results.append((time.perf_counter() - start, outcome, serializer.conflicts))
+    finally:
+        # 线程结束后不会自动关闭数据库连接
+        connection.close()
+    return results
+
+
+def check_oversell(sku_ids, stock, reserved):
+    """
+    检查每个热门商品: 剩余库存不能为负, 剩余库存 + 已下单数量 = 初始库存
+    :return: [(sku_id, 剩余库存, 已下单数量)], 只包含不满足的商品
+    """
+    if reserved:
+        # 同步还没有写入数据库的预扣库存
+        while reservation.reconcile() is None:
+            time.sleep(0.1)
+
+    stocks = dict(SKU.objects.filter(id__in=sku_ids).values_list('id', 'stock'))
+    sold = dict(OrderGoods.objects.filter(
+        order__user__username__startswith=USERNAME_PREFIX, sku_id__in=sku_ids
+    ).values('sku_id').annotate(count=Sum('count')).values_list('sku_id', 'count'))
+
+    violations = []
+    for sku_id in sku_ids:
+        if stocks[sku_id] < 0 or stocks[sku_id] + sold.get(sku_id, 0) != stock:
+            violations.append((sku_id, stocks[sku_id], sold.get(sku_id, 0)))
+    return violations
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下单并发压测')
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+    parser.add_argument('--workers', type=int, default=8, help='并发的线程数或进程数')
+    parser.add_argument('--users', type=int, default=100, help='压测用户数')
+    parser.add_argument('--orders', type=int, default=1, help='每个用户的下单次数')
+    parser.add_argument('--skus', type=int, default=5, help='热门商品数')
+    parser.add_argument('--stock', type=int, default=100, help='每个热门商品的初始库存')
+    parser.add_argument('--lines', type=int, default=2, help='每个订单的商品条数')
+    parser.add_argument('--max-count', type=int, default=2, help='每条商品的最大购买数量')
+    parser.add_argument('--reserve', action='store_true', help='热门商品开启redis预扣库存')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子, 相同种子生成相同的订单')
+    parser.add_argument('--label', default='', help='写入结果的标签')
+    parser.add_argument('--output', help='结果追加到该文件(每行一个json)')
+    options = parser.parse_args()
+
+    user_addresses, sku_ids = seed(options.users, options.skus, options.stock)
+    if options.reserve:
+        reservation.preload(sku_ids)
+
+    rand = random.Random(options.seed)
+    tasks = []
+    for _ in range(options.orders):
+        for user_id, address_id in user_addresses:
+            lines = rand.sample(sku_ids, min(options.lines, len(sku_ids)))
+            tasks.append((user_id, address_id, dict((sku_id, rand.randint(1, options.max_count)) for sku_id in lines)))
+    rand.shuffle(tasks)
+
+    # 同一用户的订单放在同一个worker中依次执行, 避免同时改写一个购物车
+    chunks = [[] for _ in range(options.workers)]
+    for task in tasks:
+        chunks[task[0] % options.workers].append(task)
+    chunks = [(chunk, sku_ids) for chunk in chunks if chunk]
+
+    if options.mode == 'threads':
+        pool = ThreadPool(options.workers)
+    else:
+        # fork之前关闭数据库连接, 子进程各自重新连接
+        connections.close_all()
+        pool = Pool(options.workers)
+
+    start = time.perf_counter()
+    results = [result for chunk_results in pool.map(place_orders, chunks) for result in chunk_results]
+    elapsed = time.perf_counter() - start
+    pool.close()
+    pool.join()
+
+    outcomes = Counter(outcome for _, outcome, _ in results)
+    ok_durations = [duration for duration, outcome, _ in results if outcome == 'ok']
+    violations = check_oversell(sku_ids, options.stock, options.reserve)
+    summary = {
+        'label': options.label,
+        'mode': options.mode,
+        'workers': options.workers,
+        'reserve': options.reserve,
+        'database': connection.vendor,
+        'attempts': len(results),
+        'orders': outcomes['ok'],
+        'elapsed': round(elapsed, 3),
+        'orders_per_second': round(outcomes['ok'] / elapsed, 1),
+        'p50_ms': round(percentile(ok_durations, 50) * 1000, 2),
+        'p99_ms': round(percentile(ok_durations, 99) * 1000, 2),
+        'conflicts': sum(conflicts for _, _, conflicts in results),
+        'outcomes': dict(outcomes),
+        'oversell_violations': len(violations),
+    }
+
+    print('模式: %(mode)s x %(workers)d  数据库: %(database)s  预扣库存: %(reserve)s' % summary)
+    print('下单请求: %(attempts)d  成功: %(orders)d  耗时: %(elapsed).2f s  吞吐量: %(orders_per_second).1f 单/s' % summary)
+    print('成功下单耗时 p50: %(p50_ms).2f ms  p99: %(p99_ms).2f ms  乐观锁冲突: %(conflicts)d 次' % summary)
+    for outcome, count in outcomes.most_common():
+        print('    %-30s %d' % (outcome, count))
+    print('超卖/库存不一致的商品: %d' % len(violations))
+    for sku_id, stock, sold in violations:
+        print('    sku %s: 剩余库存 %s, 已下单 %s, 初始库存 %s' % (sku_id, stock, sold, options.stock))
+
+    if options.output:
+        with open(options.output, 'a') as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
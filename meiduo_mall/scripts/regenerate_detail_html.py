@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 """
-功能：手动生成所有SKU的静态detail html文件
+功能：手动生成所有SKU的静态detail html文件, 按商品SPU生成, 同一SPU的SKU只查询一次
 使用方法:
     ./regenerate_detail_html.py
 """
@@ -16,96 +16,13 @@ if not os.getenv('DJANGO_SETTINGS_MODULE'):
 import django
 django.setup()
 
-from django.template import loader
-from django.conf import settings
-
-from goods.utils import get_categories
-from goods.models import SKU
-
-
-def generate_static_sku_detail_html(sku_id):
-    """
-    生成静态商品详情页面
-    :param sku_id: 商品sku id
-    """
-    # 商品分类菜单
-    categories = get_categories()
-
-    # 获取当前sku的信息
-    sku = SKU.objects.get(id=sku_id)
-    sku.images = sku.skuimage_set.all()
-
-    # 面包屑导航信息中的频道
-    goods = sku.goods
-    goods.channel = goods.category1.goodschannel_set.all()[0]
-
-    # 构建当前商品的规格键
-    sku_specs = sku.skuspecification_set.order_by('spec_id')
-    sku_key = []
-    for spec in sku_specs:
-        sku_key.append(spec.option.id)
-
-    # 获取当前商品的所有SKU
-    skus = goods.sku_set.all()
-
-    # 构建不同规格参数（选项）的sku字典
-    # spec_sku_map = {
-    #     (规格1参数id, 规格2参数id, 规格3参数id, ...): sku_id,
-    #     (规格1参数id, 规格2参数id, 规格3参数id, ...): sku_id,
-    #     ...
-    # }
-    spec_sku_map = {}
-    for s in skus:
-        # 获取sku的规格参数
-        s_specs = s.skuspecification_set.order_by('spec_id')
-        # 用于形成规格参数-sku字典的键
-        key = []
-        for spec in s_specs:
-            key.append(spec.option.id)
-        # 向规格参数-sku字典添加记录
-        spec_sku_map[tuple(key)] = s.id
-
-    # sku_id:1  options:(1,4,7)  spec:(1,2,3)
-    # sku_id:2  options:(1,3,7)  spec:(1,2,3)
-    # sku_id:3  options:(8,11)   spec:(4,5)
-    # sku_id:4  options:(8,12)   spec:(4,5)
-    # sku_id:5  options:(9,11)
-
-    # 获取当前商品的规格信息
-    specs = goods.goodsspecification_set.order_by('id')
-    # 若当前sku的规格信息不完整，则不再继续
-    if len(sku_key) < len(specs):
-        return
-    for index, spec in enumerate(specs):
-        # 复制当前sku的规格键
-        key = sku_key[:]
-        # 该规格的选项
-        options = spec.specificationoption_set.all()
-        for option in options:
-            # 在规格参数sku字典中查找符合当前规格的sku
-            key[index] = option.id
-            option.sku_id = spec_sku_map.get(tuple(key))
-
-        spec.options = options
-
-    # 渲染模板，生成静态html文件
-    context = {
-        'categories': categories,
-        'goods': goods,
-        'specs': specs,
-        'sku': sku
-    }
-
-    template = loader.get_template('detail.html')
-    html_text = template.render(context)
-    file_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, 'goods/'+str(sku_id)+'.html')
-    with open(file_path, 'w') as f:
-        f.write(html_text)
+from celery_tasks.html import generate_static_goods_detail_html
+from goods.models import Goods
 
 
 if __name__ == '__main__':
-    skus = SKU.objects.all()
-    for sku in skus:
-        print(sku.id)
-        generate_static_sku_detail_html(sku.id)
-
+    goods_ids = Goods.objects.order_by('id').values_list('id', flat=True)
+    for goods_id in goods_ids:
+        # 直接调用任务函数, 在当前进程中生成
+        result = generate_static_goods_detail_html(goods_id)
+        print(goods_id, result)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+功能：多进程多线程并发生成订单编号, 检查编号不重复, 每个线程内递增, 并统计生成速度
+使用方法:
+    ./stress_order_id.py [进程数] [每个进程的线程数] [每个线程生成的数量]
+"""
+
+import sys
+sys.path.insert(0, '../')
+
+import os
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meiduo_mall.settings.dev'
+
+import django
+django.setup()
+
+import multiprocessing
+import threading
+import time
+
+from orders.id_generator import order_id_generator
+
+
+def generate(args):
+    """
+    在子进程中生成订单编号, fork之后生成器会重新租用机器号
+    """
+    threads, number = args
+    results = [None] * threads
+
+    def run(index):
+        ids = [order_id_generator.next_id() for _ in range(number)]
+        assert ids == sorted(ids), '同一线程生成的编号不是递增的'
+        results[index] = ids
+
+    workers = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [order_id for ids in results for order_id in ids]
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    number = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(generate, [(threads, number)] * processes)
+    duration = time.perf_counter() - start
+
+    ids = [order_id for process_ids in results for order_id in process_ids]
+    unique = set(ids)
+    print('进程数: %d, 线程数: %d, 生成数量: %d, 耗时: %.2f s, %.0f 个/s' % (
+        processes, threads, len(ids), duration, len(ids) / duration))
+    print('编号长度: %s, 示例: %s' % (sorted(set(len(order_id) for order_id in ids)), ids[0]))
+    assert all(order_id.isdigit() for order_id in ids), '编号包含非数字字符'
+    assert len(unique) == len(ids), '有 %d 个重复的编号' % (len(ids) - len(unique))
+    print('没有重复的编号')